@@ -3,7 +3,7 @@
 <script src="https://cdn.datatables.net/1.10.12/js/jquery.dataTables.min.js"></script>
 <script type="text/javascript">
 $(document).ready(function() {
- $('.dataframe').DataTable( {
+ var options = {
      scrollX: true,
      lengthMenu: [[10, 25, 50, 100, 200, -1], [10, 25, 50, 100, 200, "All"]],
      initComplete: function () {
@@ -30,7 +30,16 @@ $(document).ready(function() {
            });
        });
      }
- });
+ };
+ var source = document.getElementById('summary-data');
+ if (source !== null) {
+   var table = JSON.parse(source.textContent);
+   options.data = table.data[0].map( function ( v, i ) {
+     return table.data.map( function ( column ) { return column[i]; } );
+   });
+   options.deferRender = true;
+ }
+ $('.dataframe').DataTable(options);
 });
 </script>
 <!--JavaScript End-->
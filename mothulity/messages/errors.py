@@ -52,6 +52,9 @@ Mothur does not accept dashes in the paths. Please rename:\n{}
 SHARED_NOT_FOUND = """
 No shared file found. Quitting...
 """
+SHARED_NOT_READ = """
+Could not read the shared file: {}. Quitting...
+"""
 SHARED_ALREADY_EXISTS = """
 Found shared file but you do not want to run the analysis on it. Running
 preprocessing would overwrite it. Quitting...
@@ -71,3 +74,9 @@ Type proper region name/coordinates for db cutting or use already existing datab
 COMPLETE_NONSENSE = """
 I don't know what you what me to do!!! There are no files I can recognize in here!
 """
+BATCH_MANIFEST_NOT_FOUND = """
+Batch manifest {} not found. Quitting...
+"""
+BATCH_INVALID_ARGS = """
+Invalid arguments in the batch manifest line. Job skipped.
+"""
@@ -33,3 +33,12 @@ All groups will be kept due to --keep-all argument
 TEMPLATE_USED = """
 \nTemplate used:\n\n{}
 """
+BATCH_SUMMARY_SAVED = """
+Batch summary saved in {}. Generated: {}, rejected: {}
+"""
+READS_CHECK_SAVED = """
+Reads check saved in {}. Passed: {}, failed: {}
+"""
+LENGTHS_PROFILED = """
+Lengths of {} contigs expected from {} samples profiled. screen.seqs minlength: {}, maxlength: {}
+"""
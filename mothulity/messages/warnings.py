@@ -17,3 +17,26 @@ JUNK_GROUPS_DETECTED = """
 JUNK_REMOVED = """
 {} will be removed
 """
+UNPAIRED_READS_FOUND = """
+WARNING!!! No reads file of the other direction found for:
+{}
+These files are skipped.
+"""
+DUPLICATED_READS_FOUND = """
+WARNING!!! More than one file of the same sample and direction found:
+{}
+These files are skipped.
+"""
+UNRECOGNIZED_READS_FOUND = """
+WARNING!!! Reads direction not recognized by the left and right reads signs for:
+{}
+These files are skipped.
+"""
+READS_CHECK_FAILED = """
+WARNING!!! Reads check failed for:
+{}
+These samples are skipped.
+"""
+LENGTHS_NOT_PROFILED = """
+No contigs expected from the reads. screen.seqs bounds will be optimized by mothur.
+"""
@@ -1,33 +1,21 @@
 #! /usr/bin/env python
 
-#pylint: disable=invalid-name,too-many-arguments,too-many-locals; extension-pkg-whitelist=lxml
+#pylint: disable=invalid-name,too-many-arguments,too-many-locals,import-outside-toplevel; extension-pkg-whitelist=lxml
 
 """
-Functions used by the other parts of the package
+Functions used by the other parts of the package. Heavy dependencies are
+imported by the functions using them so that the entry points start fast.
 """
 
 
 from __future__ import print_function
 from io import BytesIO
+from itertools import islice
 import base64
+import csv
+import json
 import os
 import sys
-import psutil
-
-import matplotlib#pylint: disable=wrong-import-position
-matplotlib.use('Agg')#pylint: disable=wrong-import-position
-from Bio import Phylo as ph
-from bs4 import BeautifulSoup as bs
-from lxml import etree as et
-from pandas import read_csv
-from seaborn import heatmap
-from tqdm import tqdm
-import pylab
-import numpy as np
-import jinja2 as jj2
-import pandas as pd
-import requests as rq
-import matplotlib.pyplot as plt#pylint: disable=ungrouped-imports
 
 
 def get_dir_path(file_name=""):
@@ -110,6 +98,7 @@ def determine_cpus(memory_per_cpu=3):
         GigaBytes of RAM that should be saved for a single CPU core. Default
         <3>
     """
+    import psutil
     cpus = psutil.cpu_count()
     mem = psutil.virtual_memory().total / 1024 ** 3
     supp_cpus = int(mem / memory_per_cpu)
@@ -118,6 +107,45 @@ def determine_cpus(memory_per_cpu=3):
     return supp_cpus
 
 
+def pool_map(function,
+             *iterables,
+             processes=None):
+    """
+    Apply function to the items of iterables, like map, in a pool of
+    processes. Runs in the current process if there is one process to use.
+
+    Parameters
+    -------
+    function: function
+        Picklable function to apply.
+    *iterables
+        Arguments of the function.
+    processes: int, default <None>
+        Number of processes. Number of CPUs available if <None>. Never more
+        than the number of items.
+
+    Returns
+    -------
+    list
+        Results in the order of the items.
+
+    Examples
+    -------
+    >>> pool_map(pow, [2, 3], [3, 2], processes=2)
+    [8, 9]
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    iterables = [list(i) for i in iterables]
+    items_num = min(len(i) for i in iterables) if iterables else 0
+    if processes is None:
+        processes = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    processes = max(1, min(int(processes), items_num))
+    if processes == 1:
+        return list(map(function, *iterables))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(function, *iterables))
+
+
 def load_template_file(template_file,
                        searchpath="/"):
     """
@@ -142,6 +170,7 @@ def load_template_file(template_file,
     >>> isinstance(lt, jinja2.environment.Template)
     True
     """
+    import jinja2 as jj2
     template_loader = jj2.FileSystemLoader(searchpath=searchpath)
     template_env = jj2.Environment(loader=template_loader)
     template = template_env.get_template(template_file)
@@ -194,6 +223,315 @@ def save_template(out_file_name,
         fout.write(template_rendered.encode("utf-8"))
 
 
+def cache_file_path(input_file_name,
+                    kind,
+                    cache_dir):
+    """
+    Make the cache file name of the input file in the cache directory. Input
+    files of the same name from different directories get different caches.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    kind: str
+        Name of the reader's cache. Part of the cache file name.
+    cache_dir: str
+        Cache directory.
+
+    Returns
+    -------
+    str
+        Cache file name.
+
+    Examples
+    -------
+    >>> cache_file_path("./tests/test.shared", "table", "cache").startswith("cache/test.shared.")
+    True
+    """
+    import hashlib
+    return os.path.join(cache_dir, "{0}.{1}.{2}.cache.npz".format(
+        os.path.basename(input_file_name),
+        hashlib.sha1(os.path.abspath(input_file_name).encode("utf-8")).hexdigest()[:12],
+        kind,
+    ))
+
+
+def load_cache(input_file_name,
+               kind,
+               cache_dir,
+               params=None):
+    """
+    Load binary cache of the input file parsed by one of the readers. Cache is
+    valid only if it was made from the same path, size and modification time of
+    the input file and with the same reader parameters. Unreadable cache is
+    treated as not found.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    kind: str
+        Name of the reader's cache. Part of the cache file name.
+    cache_dir: str
+        Cache directory.
+    params: dict, default <None>
+        Reader parameters the cache was made with.
+
+    Returns
+    -------
+    tuple of dict or None
+        Reader metadata and arrays. <None> if cache not found or not valid.
+    """
+    import zipfile
+    import numpy as np
+    cache_file_name = cache_file_path(input_file_name, kind, cache_dir)
+    if not os.path.isfile(cache_file_name):
+        return None
+    stat = os.stat(input_file_name)
+    source = {"path": os.path.abspath(input_file_name),
+              "size": stat.st_size,
+              "mtime": stat.st_mtime}
+    try:
+        with np.load(cache_file_name, allow_pickle=False) as cache:
+            meta = json.loads(str(cache["__meta__"]))
+            if meta["source"] != source or meta["params"] != json.loads(json.dumps(params)):
+                return None
+            arrays = {i: cache[i] for i in cache.files if i != "__meta__"}
+    except (IOError, OSError, ValueError, KeyError, EOFError, zipfile.BadZipfile):
+        return None
+    return meta["data"], arrays
+
+
+def save_cache(input_file_name,
+               kind,
+               cache_dir,
+               arrays,
+               params=None,
+               data=None):
+    """
+    Save binary cache of the input file parsed by one of the readers in the
+    cache directory. Cache is written to a temporary file first and moved into
+    place, so that an interrupted write never leaves a truncated cache.
+    Nothing is saved if the cache directory can not be written.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    kind: str
+        Name of the reader's cache. Part of the cache file name.
+    cache_dir: str
+        Cache directory. Created if it does not exist.
+    arrays: dict
+        Name as key and numpy.ndarray as value. Object arrays are not allowed.
+    params: dict, default <None>
+        Reader parameters the cache is made with.
+    data: dict, default <None>
+        Reader metadata, must be JSON-serializable.
+    """
+    import numpy as np
+    cache_file_name = cache_file_path(input_file_name, kind, cache_dir)
+    stat = os.stat(input_file_name)
+    meta = {"source": {"path": os.path.abspath(input_file_name),
+                       "size": stat.st_size,
+                       "mtime": stat.st_mtime},
+            "params": params,
+            "data": data}
+    temp_file_name = "{0}.{1}.tmp".format(cache_file_name, os.getpid())
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(temp_file_name, "wb") as fout:
+            np.savez(fout, __meta__=np.array(json.dumps(meta)), **arrays)
+        os.replace(temp_file_name, cache_file_name)
+    except (IOError, OSError):
+        if os.path.isfile(temp_file_name):
+            os.remove(temp_file_name)
+
+
+def read_table(input_file_name,
+               sep="\t",
+               cache_dir=None,
+               **kwargs):
+    """
+    Read table with pandas.read_csv. Typed columns can be cached in binary form
+    in the cache directory, so type inference runs only once per input file
+    version.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    sep: str, default <\t>
+        Delimiter to use.
+    cache_dir: str, default <None>
+        Binary cache directory. Cache is not used if <None>.
+    **kwargs
+        Passed to pandas.read_csv. Must be JSON-serializable.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Table read.
+
+    Examples
+    -------
+    >>> df = read_table("./tests/test.shared", index_col="Group")
+    >>> df.shape
+    (9, 458)
+    """
+    import numpy as np
+    import pandas as pd
+    params = dict(kwargs, sep=sep)
+    cached = load_cache(input_file_name, "table", cache_dir, params) if cache_dir else None
+    if cached is not None:
+        meta, arrays = cached
+        frames = []
+        for i, positions in enumerate(meta["blocks"]):
+            frames.append(pd.DataFrame(arrays["b{}".format(i)], columns=positions))
+        for i in meta["objects"]:
+            values = arrays["o{}".format(i)].astype(object)
+            values[arrays["n{}".format(i)]] = np.nan
+            frames.append(pd.DataFrame({i: values}))
+        index = []
+        for i in range(len(meta["index"])):
+            values = arrays["i{}".format(i)]
+            if "in{}".format(i) in arrays:
+                values = values.astype(object)
+                values[arrays["in{}".format(i)]] = np.nan
+            index.append(values)
+        df = pd.concat(frames, axis=1)[list(range(len(meta["columns"])))]
+        df.columns = meta["columns"]
+        if len(index) == 1:
+            df.index = pd.Index(index[0], name=meta["index"][0])
+        elif index:
+            df.index = pd.MultiIndex.from_arrays(index, names=meta["index"])
+        return df
+    df = pd.read_csv(input_file_name, sep=sep, **kwargs)
+    if cache_dir:
+        arrays = {}
+        blocks = {}
+        objects = []
+        for i, dtype in enumerate(df.dtypes):
+            if dtype == object:
+                objects.append(i)
+            else:
+                blocks.setdefault(dtype.str, []).append(i)
+        for i, positions in enumerate(blocks.values()):
+            arrays["b{}".format(i)] = df.iloc[:, positions].values
+        for i in objects:
+            values = df.iloc[:, i].values
+            arrays["n{}".format(i)] = pd.isnull(values)
+            arrays["o{}".format(i)] = np.where(arrays["n{}".format(i)], "", values).astype(str)
+        index = [] if isinstance(df.index, pd.RangeIndex) else list(df.index.names)
+        for i in range(len(index)):
+            values = df.index.get_level_values(i).values
+            if values.dtype == object:
+                arrays["in{}".format(i)] = pd.isnull(values)
+                values = np.where(arrays["in{}".format(i)], "", values).astype(str)
+            arrays["i{}".format(i)] = values
+        save_cache(input_file_name,
+                   "table",
+                   cache_dir,
+                   arrays,
+                   params=params,
+                   data={"columns": df.columns.tolist(),
+                         "index": index,
+                         "blocks": list(blocks.values()),
+                         "objects": objects})
+    return df
+
+
+def index_shared_labels(input_file_name,
+                        label_col="label",
+                        sep="\t"):
+    """
+    Finds byte offset and number of rows of each label block in mothur's shared
+    file.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    label_col: str, default <label>
+        Label column name in shared file.
+    sep: str, default <\t>
+        Delimiter to use for reading-in shared file.
+
+    Returns
+    -------
+    dict
+        Label as key and list of byte offset and number of rows as value, in
+        order of appearance in shared file.
+
+    Raises
+    -------
+    ValueError
+        If rows of the same label are not in one block.
+
+    Examples
+    -------
+    >>> index_shared_labels("./tests/test.shared")
+    {'0.03': [3668, 9]}
+    """
+    sep = sep.encode("utf-8")
+    labels_index = {}
+    with open(input_file_name, "rb") as fin:
+        header = fin.readline()
+        label_idx = header.rstrip(b"\r\n").split(sep).index(label_col.encode("utf-8"))
+        offset = len(header)
+        label = None
+        for line in fin:
+            row = line.split(sep, label_idx + 1)
+            if len(row) > label_idx + 1:
+                if row[label_idx] != label:
+                    label = row[label_idx]
+                    if label.decode("utf-8") in labels_index:
+                        raise ValueError("Label {0} is not in one block in {1}".format(
+                            label.decode("utf-8"),
+                            input_file_name,
+                        ))
+                    labels_index[label.decode("utf-8")] = [offset, 0]
+                labels_index[label.decode("utf-8")][1] += 1
+            offset += len(line)
+    return labels_index
+
+
+def get_shared_labels_index(input_file_name,
+                            label_col="label",
+                            sep="\t",
+                            cache_dir=None):
+    """
+    Gets labels index of mothur's shared file. Index is read from the cache
+    directory, if given, and built and cached there if not found. Nothing is
+    written if the cache directory is <None>.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    label_col: str, default <label>
+        Label column name in shared file.
+    sep: str, default <\t>
+        Delimiter to use for reading-in shared file.
+    cache_dir: str, default <None>
+        Binary cache directory. Cache is not used if <None>.
+
+    Returns
+    -------
+    dict
+        Label as key and list of byte offset and number of rows as value.
+    """
+    params = {"label_col": label_col, "sep": sep}
+    cached = load_cache(input_file_name, "labels", cache_dir, params) if cache_dir else None
+    if cached is not None:
+        return cached[0]
+    labels_index = index_shared_labels(input_file_name, label_col=label_col, sep=sep)
+    if cache_dir:
+        save_cache(input_file_name, "labels", cache_dir, {}, params=params, data=labels_index)
+    return labels_index
+
+
 def read_info_shared(input_file_name,#pylint: disable=dangerous-default-value,too-many-locals
                      min_fold=5,
                      cols={
@@ -203,9 +541,15 @@ def read_info_shared(input_file_name,#pylint: disable=dangerous-default-value,to
                          'num': "numOtus",
                      },
                      sep="\t",
-                     format_junk_grps=True):
+                     format_junk_grps=True,
+                     label=None,
+                     cache_dir=None):
     """
-    Extracts information from mothur's shared file.
+    Extracts information from mothur's shared file. The file is read line by
+    line and only the group sizes are kept, so memory use depends on the
+    number of groups, not on the number of OTUs. Only one label block is
+    read. Requested label block is found with the labels index. Group sizes
+    can be cached in binary form in the cache directory.
 
     Parameters
     -------
@@ -226,12 +570,21 @@ def read_info_shared(input_file_name,#pylint: disable=dangerous-default-value,to
         Delimiter to use for reading-in shared file.
     format_junk_grps: bool, default <True>
         Join names of groups to remove by <-> before passing to mothur.
+    label: str, default <None>
+        Label block to read. First label block if <None>.
+    cache_dir: str, default <None>
+        Binary cache directory. Cache is not used if <None>.
 
     Returns
     -------
     dict
         Information about label, number of samples and groups to remove.
 
+    Raises
+    -------
+    ValueError
+        If label is not found in shared file or the file has no OTU columns.
+
     Examples
     -------
     >>> shared_info = read_info_shared(input_file_name="./tests/test.shared")
@@ -242,17 +595,62 @@ def read_info_shared(input_file_name,#pylint: disable=dangerous-default-value,to
     >>> shared_info["junk_grps"]
     'F3D141-F3D143-F3D144'
     """
-    dtypes = {cols['label']: "str"}
-    shared_df = pd.read_csv(input_file_name, sep=sep, dtype=dtypes)
-    otus_cols = [i for i in shared_df.columns if cols['otu'] in i and i != cols['num']]
-    grps_sizes = shared_df[[cols['group']] + otus_cols].sum(axis=1)
-    label = shared_df[cols['label']][0]
-    grps_num = len(shared_df[cols['group']])
-    sizes_df = pd.DataFrame({"GROUPS": shared_df[cols['group']],
-                             "GROUP_SIZES": grps_sizes})
-    threshold = sizes_df.GROUP_SIZES.mean() / min_fold
-    size_bool = (sizes_df.GROUP_SIZES < threshold)
-    junk_grps = list(sizes_df[size_bool].GROUPS)
+    import numpy as np
+    if label is not None:
+        label = str(label)
+    params = {"label": label, "cols": cols, "sep": sep}
+    cached = load_cache(input_file_name, "info", cache_dir, params) if cache_dir else None
+    if cached is not None:
+        label = cached[0]["label"]
+        grps = cached[0]["groups"]
+        grps_sizes = cached[1]["sizes"].tolist()
+    else:
+        with open(input_file_name, "rb") as fin:
+            header = fin.readline().decode("utf-8").rstrip("\r\n").split(sep)
+            label_idx = header.index(cols['label'])
+            group_idx = header.index(cols['group'])
+            otus_idx = [i for i, v in enumerate(header) if cols['otu'] in v and v != cols['num']]
+            if not otus_idx:
+                raise ValueError("No OTU columns found in {}".format(input_file_name))
+            otus_slice = None
+            if otus_idx == list(range(otus_idx[0], otus_idx[-1] + 1)):
+                otus_slice = slice(otus_idx[0], otus_idx[-1] + 1)
+            lines = fin
+            if label is not None:
+                labels_index = get_shared_labels_index(input_file_name,
+                                                       label_col=cols['label'],
+                                                       sep=sep,
+                                                       cache_dir=cache_dir)
+                if label not in labels_index:
+                    raise ValueError("Label {0} not found in {1}".format(label, input_file_name))
+                offset, rows_num = labels_index[label]
+                fin.seek(offset)
+                lines = islice(fin, rows_num)
+            grps = []
+            grps_sizes = []
+            for line in lines:
+                row = line.decode("utf-8").rstrip("\r\n").split(sep)
+                if len(row) < 2:
+                    continue
+                if label is None:
+                    label = row[label_idx]
+                if row[label_idx] != label:
+                    break
+                grps.append(row[group_idx])
+                if otus_slice is not None:
+                    grps_sizes.append(sum(map(int, row[otus_slice])))
+                else:
+                    grps_sizes.append(sum(int(row[i]) for i in otus_idx))
+        if cache_dir:
+            save_cache(input_file_name,
+                       "info",
+                       cache_dir,
+                       {"sizes": np.array(grps_sizes, dtype=np.int64)},
+                       params=params,
+                       data={"label": label, "groups": grps})
+    grps_num = len(grps)
+    threshold = sum(grps_sizes) / float(grps_num) / min_fold
+    junk_grps = [grp for grp, size in zip(grps, grps_sizes) if size < threshold]
     if format_junk_grps is True:
         junk_grps = "-".join(junk_grps)
     out_dict = {"label": label,
@@ -261,10 +659,356 @@ def read_info_shared(input_file_name,#pylint: disable=dangerous-default-value,to
     return out_dict
 
 
+def read_sparse_shared(input_file_name,#pylint: disable=dangerous-default-value
+                       label=None,
+                       cols={
+                           'label': 'label',
+                           'group': "Group",
+                           'otu': "Otu",
+                           'num': "numOtus",
+                       },
+                       sep="\t",
+                       cache_dir=None):
+    """
+    Read mothur's shared file into sparse, CSR-style shared table. Only non-zero
+    counts are kept, row by row, so memory use depends on the number of
+    non-zero counts, not on the number of groups times the number of OTUs.
+    Sparse table can be cached in binary form in the cache directory.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    label: str, default <None>
+        Label block to read. First label block if <None>.
+    cols: dict
+        Label, group, OTU prefix and number of OTUs column names in shared
+        file.
+    sep: str, default <\t>
+        Delimiter to use for reading-in shared file.
+    cache_dir: str, default <None>
+        Binary cache directory. Cache is not used if <None>.
+
+    Returns
+    -------
+    dict
+        <label>: str, label of the block read.
+        <groups>: list of str, group names.
+        <otus>: list of str, OTU names.
+        <indptr>: numpy.ndarray of int, start of each group in <indices> and
+        <data>, followed by the number of non-zero counts.
+        <indices>: numpy.ndarray of int, OTU indices of non-zero counts.
+        <data>: numpy.ndarray of int, non-zero counts.
+
+    Raises
+    -------
+    ValueError
+        If label is not found in shared file.
+
+    Examples
+    -------
+    >>> sparse_shared = read_sparse_shared("./tests/test.shared")
+    >>> len(sparse_shared["groups"]), len(sparse_shared["otus"])
+    (9, 456)
+    >>> int(sparse_shared["data"].sum())
+    44132
+    """
+    import numpy as np
+    if label is not None:
+        label = str(label)
+    params = {"label": label, "cols": cols, "sep": sep}
+    cached = load_cache(input_file_name, "sparse", cache_dir, params) if cache_dir else None
+    if cached is not None:
+        meta, arrays = cached
+        return {"label": meta["label"],
+                "groups": arrays["groups"].tolist(),
+                "otus": arrays["otus"].tolist(),
+                "indptr": arrays["indptr"],
+                "indices": arrays["indices"],
+                "data": arrays["data"]}
+    with open(input_file_name, "rb") as fin:
+        header = fin.readline().decode("utf-8").rstrip("\r\n").split(sep)
+        label_idx = header.index(cols['label'])
+        group_idx = header.index(cols['group'])
+        otus_idx = [i for i, v in enumerate(header) if cols['otu'] in v and v != cols['num']]
+        lines = fin
+        if label is not None:
+            labels_index = get_shared_labels_index(input_file_name,
+                                                   label_col=cols['label'],
+                                                   sep=sep,
+                                                   cache_dir=cache_dir)
+            if label not in labels_index:
+                raise ValueError("Label {0} not found in {1}".format(label, input_file_name))
+            offset, rows_num = labels_index[label]
+            fin.seek(offset)
+            lines = islice(fin, rows_num)
+        groups = []
+        indptr = [0]
+        indices = []
+        data = []
+        for line in lines:
+            row = line.decode("utf-8").rstrip("\r\n").split(sep)
+            if len(row) < 2:
+                continue
+            if label is None:
+                label = row[label_idx]
+            if row[label_idx] != label:
+                break
+            counts = np.array([row[i] for i in otus_idx], dtype=np.int64)
+            nonzero = np.flatnonzero(counts)
+            groups.append(row[group_idx])
+            indices.append(nonzero.astype(np.int32))
+            data.append(counts[nonzero].astype(np.int32))
+            indptr.append(indptr[-1] + len(nonzero))
+    sparse_shared = {"label": label,
+                     "groups": groups,
+                     "otus": [header[i] for i in otus_idx],
+                     "indptr": np.array(indptr, dtype=np.int64),
+                     "indices": np.concatenate(indices) if indices else np.array([], dtype=np.int32),
+                     "data": np.concatenate(data) if data else np.array([], dtype=np.int32)}
+    if cache_dir:
+        save_cache(input_file_name,
+                   "sparse",
+                   cache_dir,
+                   {"groups": np.array(groups, dtype=str),
+                    "otus": np.array(sparse_shared["otus"], dtype=str),
+                    "indptr": sparse_shared["indptr"],
+                    "indices": sparse_shared["indices"],
+                    "data": sparse_shared["data"]},
+                   params=params,
+                   data={"label": label})
+    return sparse_shared
+
+
+def write_sparse_shared(sparse_shared,#pylint: disable=dangerous-default-value
+                        output_file_name,
+                        cols={
+                            'label': 'label',
+                            'group': "Group",
+                            'num': "numOtus",
+                        },
+                        sep="\t"):
+    """
+    Write sparse shared table to mothur's shared file. Groups are written one
+    by one, so only one dense row is held in memory at the time.
+
+    Parameters
+    -------
+    sparse_shared: dict
+        Sparse shared table from mothulity.utilities.read_sparse_shared.
+    output_file_name: str
+        Output file name.
+    cols: dict
+        Label, group and number of OTUs column names in shared file.
+    sep: str, default <\t>
+        Delimiter to use in shared file.
+    """
+    import numpy as np
+    otus_num = len(sparse_shared["otus"])
+    indptr = sparse_shared["indptr"]
+    with open(output_file_name, "w") as fout:
+        fout.write(sep.join([cols['label'], cols['group'], cols['num']] + sparse_shared["otus"]))
+        fout.write("\n")
+        for i, group in enumerate(sparse_shared["groups"]):
+            counts = np.zeros(otus_num, dtype=np.int64)
+            counts[sparse_shared["indices"][indptr[i]:indptr[i + 1]]] = \
+                sparse_shared["data"][indptr[i]:indptr[i + 1]]
+            fout.write(sep.join([sparse_shared["label"], group, str(otus_num)] +
+                                counts.astype(str).tolist()))
+            fout.write("\n")
+
+
+def sparse_group_totals(sparse_shared):
+    """
+    Get total count of each group of sparse shared table.
+
+    Parameters
+    -------
+    sparse_shared: dict
+        Sparse shared table from mothulity.utilities.read_sparse_shared.
+
+    Returns
+    -------
+    numpy.ndarray of int
+        Total count of each group.
+    """
+    import numpy as np
+    cumsum = np.concatenate([[0], np.cumsum(sparse_shared["data"], dtype=np.int64)])
+    return cumsum[sparse_shared["indptr"][1:]] - cumsum[sparse_shared["indptr"][:-1]]
+
+
+def sparse_junk_groups(sparse_shared,
+                       min_fold=5):
+    """
+    Get groups of sparse shared table which are smaller than the mean group
+    size divided by min_fold. Same rule as in
+    mothulity.utilities.read_info_shared.
+
+    Parameters
+    -------
+    sparse_shared: dict
+        Sparse shared table from mothulity.utilities.read_sparse_shared.
+    min_fold: int, default <5>
+        Fraction of mean group size below which groups will be removed before
+        analysis.
+
+    Returns
+    -------
+    list of str
+        Names of groups to remove.
+    """
+    totals = sparse_group_totals(sparse_shared)
+    threshold = totals.mean() / min_fold
+    return [group for group, total in zip(sparse_shared["groups"], totals) if total < threshold]
+
+
+def subsample_sparse_shared(sparse_shared,
+                            size=None,
+                            seed=None):
+    """
+    Subsample each group of sparse shared table to the same size, without
+    replacement, like mothur's sub.sample. Counts of the OTUs are drawn from
+    the multivariate hypergeometric distribution, so the cost depends on the
+    number of OTUs in the group and not on its size. Groups smaller than the
+    size are removed.
+
+    Parameters
+    -------
+    sparse_shared: dict
+        Sparse shared table from mothulity.utilities.read_sparse_shared.
+    size: int, default <None>
+        Number of counts to draw from each group. Size of the smallest group if
+        <None>.
+    seed: int, default <None>
+        Seed of the random numbers generator.
+
+    Returns
+    -------
+    dict
+        Subsampled sparse shared table.
+    """
+    import numpy as np
+    random_state = np.random.default_rng(seed)
+    totals = sparse_group_totals(sparse_shared)
+    if size is None:
+        size = int(totals.min())
+    indptr = sparse_shared["indptr"]
+    groups = []
+    sub_indptr = [0]
+    sub_indices = []
+    sub_data = []
+    for i, group in enumerate(sparse_shared["groups"]):
+        if totals[i] < size:
+            continue
+        indices = sparse_shared["indices"][indptr[i]:indptr[i + 1]]
+        data = sparse_shared["data"][indptr[i]:indptr[i + 1]]
+        sub_counts = random_state.multivariate_hypergeometric(
+            data.astype(np.int64),
+            size,
+            method="marginals",
+        )
+        nonzero = np.flatnonzero(sub_counts)
+        groups.append(group)
+        sub_indices.append(indices[nonzero])
+        sub_data.append(sub_counts[nonzero].astype(np.int32))
+        sub_indptr.append(sub_indptr[-1] + len(nonzero))
+    return {"label": sparse_shared["label"],
+            "groups": groups,
+            "otus": list(sparse_shared["otus"]),
+            "indptr": np.array(sub_indptr, dtype=np.int64),
+            "indices": np.concatenate(sub_indices) if sub_indices else np.array([], dtype=np.int32),
+            "data": np.concatenate(sub_data) if sub_data else np.array([], dtype=np.int32)}
+
+
+def select_html(input_file_name,
+                selectors):
+    """
+    Extract tags from html file without building the document tree. The file
+    is memory-mapped and scanned for the start tag of each selector, skipping
+    the contents of scripts, so only the part of the file up to the tags found
+    is read. Selectors are: <tag>, <tag#id>, <tag[attr]>, <tag[attr=value]> or
+    <tag[attr*=value]>. First matching tag is taken.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    selectors: dict of str
+        Fragment name as key and selector as value.
+
+    Returns
+    -------
+    dict of lists
+        Fragment name as key and start and end offset of the matching tag in
+        the file as value. <None> if no tag matches.
+    """
+    import mmap
+    import re
+    void_tags = (b"area", b"base", b"br", b"col", b"embed", b"hr", b"img",
+                 b"input", b"link", b"meta", b"source", b"track", b"wbr")
+    raw_tags = (b"script", b"style", b"textarea")
+    attr_re = re.compile(rb"""([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?""")
+    selector_re = re.compile(r"^([\w-]+)(?:#([\w-]+))?(?:\[([\w:-]+)(?:(\*?=)([^\]]*))?\])?$")
+
+    def scan(html):
+        spans = {}
+        scripts = []
+        script_iter = re.compile(rb"<script\b[^>]*>.*?</script\s*>", re.I | re.S).finditer(html)
+
+        def in_script(pos):
+            while not scripts or scripts[-1][0] <= pos:
+                match = next(script_iter, None)
+                if match is None:
+                    break
+                scripts.append(match.span())
+            return any(start < pos < end for start, end in scripts)
+
+        for name, selector in selectors.items():
+            tag, tag_id, attr, operator, value = selector_re.match(selector).groups()
+            tag = tag.encode().lower()
+            wanted = {}
+            if tag_id is not None:
+                wanted[b"id"] = ("=", tag_id)
+            if attr is not None:
+                wanted[attr.encode().lower()] = (operator, (value or "").strip("\"'"))
+            spans[name] = None
+            start_re = re.compile(rb"<" + re.escape(tag) + rb"(?=[\s/>])([^>]*)>", re.I)
+            for match in start_re.finditer(html):
+                if tag != b"script" and in_script(match.start()):
+                    continue
+                attrs = {i.group(1).lower(): (i.group(2) or i.group(3) or i.group(4) or b"").decode("utf-8")
+                         for i in attr_re.finditer(match.group(1))}
+                if not all(i in attrs and
+                           (op is None or
+                            (op == "=" and attrs[i] == val) or
+                            (op == "*=" and val in attrs[i]))
+                           for i, (op, val) in wanted.items()):
+                    continue
+                end = match.end()
+                if tag in raw_tags:
+                    end = re.compile(rb"</" + re.escape(tag) + rb"\s*>", re.I).search(html, end).end()
+                elif tag not in void_tags and not match.group(1).endswith(b"/"):
+                    depth = 1
+                    for edge in re.compile(rb"<(/?)" + re.escape(tag) + rb"(?=[\s/>])[^>]*>", re.I).finditer(html, end):
+                        depth += -1 if edge.group(1) else 1
+                        if depth == 0:
+                            end = edge.end()
+                            break
+                spans[name] = [match.start(), end]
+                break
+        return spans
+
+    with open(input_file_name, "rb") as fin:
+        if os.fstat(fin.fileno()).st_size == 0:
+            return {i: None for i in selectors}
+        with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as html:
+            return scan(html)
+
+
 def parse_html(input_file_name,#pylint: disable=inconsistent-return-statements
                html_type,
-               parser="html.parser",
-               newline="\n"):
+               selectors=None,
+               cache_dir=None):
     """
     Extract particular tags from html so that they can be placed in
     another html without iframe.
@@ -273,35 +1017,203 @@ def parse_html(input_file_name,#pylint: disable=inconsistent-return-statements
     -------
     input_file_name: str
         Input file name.
+    html_type: str
+        One of krona, summary, nmds, rarefaction.
+    selectors: dict, default <None>
+        Fragment name as key and selector, as in
+        mothulity.utilities.select_html, as value. Nested one level for krona.
+        Default selectors of the html_type if <None>.
+    cache_dir: str, default <None>
+        Directory of the binary cache keeping offsets of the fragments. Cache
+        is not used if <None>.
 
+    Returns
+    -------
+    dict
+        Fragment name as key and tag as str as value. Empty str if the tag was
+        not found.
     """
-    with open(input_file_name) as fin:
-        html = fin.read()
-    soup = bs(html, parser)
-    if html_type == "krona":
-        head = [str(i) for i in soup.head if i != newline]
-        body = [str(i) for i in soup.body if i != newline]
-        return {"head": {"link": head[1],
-                         "script_not_found": head[2],
-                         "script_functional": head[3]},
-                "body": {"img_hidden": body[0],
-                         "img_loading": body[1],
-                         "img_logo": body[2],
-                         "noscript": body[3],
-                         "div_krona": body[4]}}
-    if html_type == "summary":
-        tags = [str(i) for i in list(soup.children) if i != "\n"]
-        return {"link": tags[0],
-                "table": tags[1],
-                "googleapis_script": tags[3],
-                "datatables_script": tags[4],
-                "script": tags[5]}
-    if html_type in ("nmds", "rarefaction"):
-        return {"img": soup.img}
+    default_selectors = {
+        "krona": {"head": {"link": "link",
+                           "script_not_found": "script#notfound",
+                           "script_functional": "script[language=javascript]"},
+                  "body": {"img_hidden": "img#hiddenImage",
+                           "img_loading": "img#loadingImage",
+                           "img_logo": "img#logo",
+                           "noscript": "noscript",
+                           "div_krona": "div[style=display:none]"}},
+        "summary": {"link": "link",
+                    "table": "table",
+                    "data": "script[type=application/json]",
+                    "googleapis_script": "script[src*=googleapis]",
+                    "datatables_script": "script[src*=dataTables]",
+                    "script": "script[type=text/javascript]"},
+        "nmds": {"img": "img"},
+        "rarefaction": {"img": "img"},
+    }
+    if selectors is None:
+        if html_type not in default_selectors:
+            return
+        selectors = default_selectors[html_type]
+    flat = {}
+    for name, selector in selectors.items():
+        if isinstance(selector, dict):
+            flat.update({"{0}.{1}".format(name, i): j for i, j in selector.items()})
+        else:
+            flat[name] = selector
+    spans = None
+    if cache_dir:
+        cached = load_cache(input_file_name, "html", cache_dir, params=flat)
+        if cached is not None:
+            spans = cached[0]
+    if spans is None:
+        spans = select_html(input_file_name, flat)
+        if cache_dir:
+            save_cache(input_file_name, "html", cache_dir, {}, params=flat, data=spans)
+    fragments = {}
+    with open(input_file_name, "rb") as fin:
+        for name, span in spans.items():
+            fragment = ""
+            if span is not None:
+                fin.seek(span[0])
+                fragment = fin.read(span[1] - span[0]).decode("utf-8")
+            if "." in name:
+                group, name = name.split(".", 1)
+                fragments.setdefault(group, {})[name] = fragment
+            else:
+                fragments[name] = fragment
+    return fragments
+
+
+def file_digest(input_file_name,
+                chunk_size=1 << 20):
+    """
+    Compute sha256 digest of the file content, reading it in chunks.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    chunk_size: int, default <1048576>
+        Number of bytes read at once.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest.
+    """
+    import hashlib
+    digest = hashlib.sha256()
+    with open(input_file_name, "rb") as fin:
+        for chunk in iter(lambda: fin.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_fragments(manifest_file_name,
+                     sources):
+    """
+    Get the results of reading the report's input files, taken from the
+    fragment files listed in the manifest whenever the input file and the
+    reader's arguments did not change. An input file with new modification
+    time is read again only if its content hash changed. Each result is kept
+    in its own JSON file next to the manifest and the manifest holds its name
+    and content hash only, so unchanged results are neither rewritten nor
+    copied into the manifest. Fragment file not matching its hash is read
+    again. The manifest is rewritten only if anything was read again.
+    Entries not in sources are kept.
+
+    Parameters
+    -------
+    manifest_file_name: str
+        JSON manifest file name.
+    sources: dict of lists
+        Fragment name as key and input file name, reading function and its
+        keyword arguments as value. Result of the function must be
+        JSON-serializable.
+
+    Returns
+    -------
+    dict
+        Fragment name as key and result of the reading function as value.
+    """
+    import hashlib
+
+    def load_fragment(entry):
+        try:
+            with open(os.path.join(manifest_dir, entry["fragment_file"]), "rb") as fin:
+                content = fin.read()
+            if hashlib.sha256(content).hexdigest() == entry["fragment_sha256"]:
+                return True, json.loads(content.decode("utf-8"))
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        return False, None
+
+    def save_atomic(file_name, content):
+        temp_file_name = "{0}.{1}.tmp".format(file_name, os.getpid())
+        try:
+            with open(temp_file_name, "wb") as fout:
+                fout.write(content)
+            os.replace(temp_file_name, file_name)
+        except (IOError, OSError):
+            if os.path.isfile(temp_file_name):
+                os.remove(temp_file_name)
+            return False
+        return True
+
+    manifest_dir = os.path.dirname(manifest_file_name)
+    try:
+        with open(manifest_file_name) as fin:
+            manifest = json.load(fin)
+    except (IOError, OSError, ValueError):
+        manifest = {}
+    fragments = {}
+    changed = False
+    for name, (input_file_name, function, kwargs) in sources.items():
+        stat = os.stat(input_file_name)
+        source = {"path": os.path.abspath(input_file_name),
+                  "reader": function.__name__,
+                  "kwargs": json.loads(json.dumps(kwargs))}
+        entry = manifest.get(name, {})
+        digest = None
+        if entry.get("source") == source:
+            if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+                digest = file_digest(input_file_name)
+            if digest in (None, entry["sha256"]):
+                found, fragment = load_fragment(entry)
+                if found is True:
+                    if digest is not None:
+                        entry["mtime"] = stat.st_mtime
+                        changed = True
+                    fragments[name] = fragment
+                    continue
+        if digest is None:
+            digest = file_digest(input_file_name)
+        fragments[name] = function(input_file_name, **kwargs)
+        content = json.dumps(fragments[name]).encode("utf-8")
+        fragment_file_name = "{0}.{1}.json".format(
+            os.path.splitext(os.path.basename(manifest_file_name))[0],
+            name,
+        )
+        if save_atomic(os.path.join(manifest_dir, fragment_file_name), content) is False:
+            manifest.pop(name, None)
+            changed = True
+            continue
+        manifest[name] = {"source": source,
+                          "size": stat.st_size,
+                          "mtime": stat.st_mtime,
+                          "sha256": digest,
+                          "fragment_file": fragment_file_name,
+                          "fragment_sha256": hashlib.sha256(content).hexdigest()}
+        changed = True
+    if changed is True:
+        save_atomic(manifest_file_name, json.dumps(manifest).encode("utf-8"))
+    return fragments
 
 
 def names_sanitizer(files_directory,
-                    unwanted_sign):
+                    unwanted_sign,
+                    recursive=False):
     """
     Remove desired sign from file names from all files in given directory.
 
@@ -311,6 +1223,8 @@ def names_sanitizer(files_directory,
         Input directory.
     unwanted_sign: str,
         Sign to be removed from file names.
+    recursive: bool, default <False>
+        Rename files in the subdirectories too.
 
     Examples
     -------
@@ -320,12 +1234,362 @@ def names_sanitizer(files_directory,
     >>> "testtesttest.test" in os.listdir("./tests/")
     True
     """
-    for i in os.listdir(files_directory):
-        if unwanted_sign in i:
+    for i in list(os.scandir(files_directory)):
+        if recursive is True and i.is_dir():
+            names_sanitizer(i.path, unwanted_sign, recursive=True)
+        if unwanted_sign in i.name:
             os.rename("{0}/{1}".format(files_directory,
-                                       i),
+                                       i.name),
                       "{0}/{1}".format(files_directory,
-                                       i.replace(unwanted_sign, "")))
+                                       i.name.replace(unwanted_sign, "")))
+
+
+def scan_files(files_directory,
+               recursive=False):
+    """
+    Yield paths of all the files in the directory, sorted by name within
+    each directory.
+
+    Parameters
+    -------
+    files_directory: str
+        Input directory.
+    recursive: bool, default <False>
+        Yield files from the subdirectories too.
+
+    Yields
+    -------
+    str
+        File path, starting with files_directory.
+    """
+    entries = sorted(os.scandir(files_directory), key=lambda i: i.name)
+    for i in entries:
+        if i.is_file():
+            yield "{0}/{1}".format(files_directory, i.name)
+    if recursive is True:
+        for i in entries:
+            if i.is_dir():
+                for ii in scan_files("{0}/{1}".format(files_directory, i.name), recursive=True):
+                    yield ii
+
+
+def index_read_pairs(files_directory,
+                     split_sign="_",
+                     files_extension="fastq",
+                     left_reads_sign="R1",
+                     right_reads_sign="R2",
+                     recursive=False):
+    """
+    Pair left and right reads files in one pass over the directory. Names are
+    divided into sections by split sign. First section is the sample name. A
+    file is left or right if one of the sections equals the left or right
+    reads sign. Left and right files are paired if the rest of their names,
+    e.g. lane number, is the same. Gzipped files are recognized too. Files
+    whose direction cannot be told apart are reported, not skipped silently.
+
+    Parameters
+    -------
+    files_directory: str
+        Input directory.
+    split_sign: str, default <_>
+        Character by which file names are split into sections.
+    files_extension: str, default <fastq>
+        Only file names with this extension, optionally followed by <.gz>, are
+        taken as input.
+    left_reads_sign: str, default <R1>
+        Section by which file names are recognized as left.
+    right_reads_sign: str, default <R2>
+        Section by which file names are recognized as right.
+    recursive: bool, default <False>
+        Look for files in the subdirectories too.
+
+    Returns
+    -------
+    dict of lists
+        <pairs> as dicts with <name>, <left_reads> and <right_reads>,
+        sorted by sample name. <unpaired> files without the other reads file
+        and <duplicated> files with more than one file of the same sample,
+        direction and rest of the name, e.g. found in different directories.
+        <unrecognized> files with none or more than one section equal to the
+        reads signs or with the reads sign as the first section.
+
+    Examples
+    -------
+    >>> read_pairs = index_read_pairs("./tests")
+    >>> [i["name"] for i in read_pairs["pairs"]]
+    ['test1', 'test2']
+    >>> read_pairs["pairs"][0]["right_reads"]
+    './tests/test1_S001_R2.fastq'
+    >>> read_pairs["unpaired"], read_pairs["duplicated"], read_pairs["unrecognized"]
+    ([], [], [])
+    """
+    extensions = (".{}".format(files_extension), ".{}.gz".format(files_extension))
+    directions = {left_reads_sign: "left", right_reads_sign: "right"}
+    index = {}
+    unrecognized = []
+    for path in scan_files(files_directory, recursive=recursive):
+        file_name = os.path.basename(path)
+        extension = [i for i in extensions if file_name.endswith(i)]
+        if not extension:
+            continue
+        sections = file_name[:-len(extension[-1])].split(split_sign)
+        signs = [i for i, section in enumerate(sections) if section in directions]
+        if len(signs) != 1 or signs[0] == 0:
+            unrecognized.append(path)
+            continue
+        direction = directions[sections[signs[0]]]
+        key = (sections[0], tuple(sections[1:signs[0]] + sections[signs[0] + 1:]))
+        index.setdefault(key, {"left": [], "right": []})[direction].append(path)
+    read_pairs = {"pairs": [],
+                  "unpaired": [],
+                  "duplicated": [],
+                  "unrecognized": sorted(unrecognized)}
+    for key in sorted(index):
+        files = index[key]
+        if len(files["left"]) > 1 or len(files["right"]) > 1:
+            read_pairs["duplicated"] += files["left"] + files["right"]
+        elif not files["left"] or not files["right"]:
+            read_pairs["unpaired"] += files["left"] + files["right"]
+        else:
+            read_pairs["pairs"].append({"name": key[0],
+                                        "left_reads": files["left"][0],
+                                        "right_reads": files["right"][0]})
+    return read_pairs
+
+
+def open_fastq(input_file_name):
+    """
+    Open FASTQ file, plain or gzipped, for buffered reading in binary mode.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name. Gzipped if ending with <.gz>.
+
+    Returns
+    -------
+    io.BufferedReader
+        Opened file.
+    """
+    import gzip
+    import io
+    if input_file_name.endswith(".gz"):
+        return io.BufferedReader(gzip.open(input_file_name, "rb"), buffer_size=1 << 20)
+    return open(input_file_name, "rb", buffering=1 << 20)
+
+
+def check_fastq(input_file_name):
+    """
+    Stream FASTQ file, plain or gzipped, counting the reads and checking the
+    structure of each record.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name. Gzipped if ending with <.gz>.
+
+    Returns
+    -------
+    dict
+        <reads> number of complete reads and <error> description of the
+        first problem found or <None>.
+
+    Examples
+    -------
+    >>> check_fastq("./tests/test1_S001_R1.fastq")
+    {'reads': 0, 'error': 'no reads'}
+    """
+    import zlib
+    reads = 0
+    error = None
+    try:
+        with open_fastq(input_file_name) as fin:
+            lines = iter(fin)
+            for header in lines:
+                sequence = next(lines, b"").rstrip()
+                separator = next(lines, b"")
+                quality = next(lines, b"").rstrip()
+                if not header.startswith(b"@"):
+                    error = "record {} does not start with @".format(reads + 1)
+                elif not separator.startswith(b"+"):
+                    error = "record {} is truncated or has no + line".format(reads + 1)
+                elif len(sequence) != len(quality):
+                    error = "record {} has sequence and quality of different length".format(reads + 1)
+                if error is not None:
+                    break
+                reads += 1
+    except (EOFError, OSError, zlib.error) as err:
+        error = "unreadable after {0} records: {1}".format(reads, err)
+    if error is None and reads == 0:
+        error = "no reads"
+    return {"reads": reads,
+            "error": error}
+
+
+def check_read_pairs(read_pairs,
+                     processes=None):
+    """
+    Check and count the reads of all the paired files concurrently in a pool
+    of processes. A sample passes if both its files are correct and hold the
+    same number of reads.
+
+    Parameters
+    -------
+    read_pairs: list of dicts
+        Pairs with <name>, <left_reads> and <right_reads>, as returned by
+        mothulity.utilities.index_read_pairs.
+    processes: int, default <None>
+        Number of processes. Number of CPUs available if <None>.
+
+    Returns
+    -------
+    list of dicts
+        Pairs with <left_count>, <right_count> and <status>, which is <ok> or
+        description of the problem.
+    """
+    files = [i[ii] for i in read_pairs for ii in ("left_reads", "right_reads")]
+    checks = dict(zip(files, pool_map(check_fastq, files, processes=processes)))
+    checked_pairs = []
+    for i in read_pairs:
+        left = checks[i["left_reads"]]
+        right = checks[i["right_reads"]]
+        if left["error"] is not None:
+            status = "left reads: {}".format(left["error"])
+        elif right["error"] is not None:
+            status = "right reads: {}".format(right["error"])
+        elif left["reads"] != right["reads"]:
+            status = "different number of left and right reads"
+        else:
+            status = "ok"
+        checked_pairs.append(dict(i,
+                                  left_count=left["reads"],
+                                  right_count=right["reads"],
+                                  status=status))
+    return checked_pairs
+
+
+def read_pair_lengths(left_reads,
+                      right_reads,
+                      max_reads=10000,
+                      seed_size=20):
+    """
+    Count lengths of the reads and of the contigs expected from them, streaming
+    the first max_reads pairs. Contig length is found by placing a seed from
+    the end of the left read in the reverse complement of the right read. Pairs
+    with no seed placed are not counted in the contig lengths.
+
+    Parameters
+    -------
+    left_reads: str
+        Left reads file name.
+    right_reads: str
+        Right reads file name.
+    max_reads: int, default <10000>
+        Number of read pairs to profile.
+    seed_size: int, default <20>
+        Number of bases placed in the other read.
+
+    Returns
+    -------
+    dict of numpy.ndarray
+        <left>, <right> and <contig> counts of each length.
+    """
+    import numpy as np
+    complement = bytes.maketrans(b"ACGTNacgtn", b"TGCANtgcan")
+    lengths = {"left": [],
+               "right": [],
+               "contig": []}
+    with open_fastq(left_reads) as left_fin, open_fastq(right_reads) as right_fin:
+        for i, (left_line, right_line) in enumerate(zip(left_fin, right_fin)):
+            if i // 4 >= max_reads:
+                break
+            if i % 4 != 1:
+                continue
+            left = left_line.rstrip()
+            right = right_line.rstrip().translate(complement)[::-1]
+            lengths["left"].append(len(left))
+            lengths["right"].append(len(right))
+            for margin in (10, 30, 50):
+                start = len(left) - seed_size - margin
+                if start < 0:
+                    break
+                pos = right.find(left[start:start + seed_size])
+                if pos >= 0:
+                    lengths["contig"].append(start + len(right) - pos)
+                    break
+    return {k: np.bincount(np.array(v, dtype=np.int64)) for k, v in lengths.items()}
+
+
+def profile_read_lengths(read_pairs,
+                         max_reads=10000,
+                         processes=None):
+    """
+    Count lengths of the reads and of the expected contigs of all the samples
+    concurrently in a pool of processes.
+
+    Parameters
+    -------
+    read_pairs: list of dicts
+        Pairs with <left_reads> and <right_reads>, as returned by
+        mothulity.utilities.index_read_pairs.
+    max_reads: int, default <10000>
+        Number of read pairs profiled per sample.
+    processes: int, default <None>
+        Number of processes. Number of CPUs available if <None>.
+
+    Returns
+    -------
+    dict of numpy.ndarray
+        <left>, <right> and <contig> counts of each length in all the samples.
+    """
+    import numpy as np
+    profiles = pool_map(read_pair_lengths,
+                        [i["left_reads"] for i in read_pairs],
+                        [i["right_reads"] for i in read_pairs],
+                        [max_reads] * len(read_pairs),
+                        processes=processes)
+    profile = {}
+    for k in ("left", "right", "contig"):
+        size = max([len(i[k]) for i in profiles] + [0])
+        profile[k] = np.zeros(size, dtype=np.int64)
+        for i in profiles:
+            profile[k][:len(i[k])] += i[k]
+    return profile
+
+
+def length_bounds(lengths_counts,
+                  criteria=95):
+    """
+    Get minimum and maximum length, so that criteria percent of sequences are
+    not shorter than the minimum and criteria percent are not longer than the
+    maximum, like screen.seqs optimize=start-end.
+
+    Parameters
+    -------
+    lengths_counts: numpy.ndarray
+        Number of sequences of each length.
+    criteria: float, default <95>
+        Percentage of sequences kept by each bound.
+
+    Returns
+    -------
+    tuple of int
+        Minimum and maximum length. <None> if there are no sequences.
+
+    Examples
+    -------
+    >>> import numpy as np
+    >>> length_bounds(np.bincount([250] * 5 + [252] * 90 + [300] * 5), criteria=90)
+    (252, 252)
+    """
+    import numpy as np
+    total = lengths_counts.sum()
+    if total == 0:
+        return None
+    cumulative = np.cumsum(lengths_counts)
+    min_length = int(np.searchsorted(cumulative, total * (100 - float(criteria)) / 100, side="right"))
+    max_length = int(np.searchsorted(cumulative, total * float(criteria) / 100, side="left"))
+    return min_length, max_length
 
 
 def left_n_right_generator(files_directory,
@@ -336,7 +1600,8 @@ def left_n_right_generator(files_directory,
     """
     Returns dict containing two lists of file names. Names are divided into
     sections by split sign. Then, names are recognized as left or right by
-    given set of characters.
+    given set of characters. Only the paired files are listed, see
+    mothulity.utilities.index_read_pairs.
 
     Parameters
     -------
@@ -372,37 +1637,34 @@ def left_n_right_generator(files_directory,
     >>> filenames["right"][1]["right_reads"]
     './tests/test2_S001_R2.fastq'
     """
-    left_name_reads_list = []
-    right_name_reads_list = []
-    files_list = os.listdir(files_directory)
-    files_list = [i for i in files_list if files_extension == i.split(".")[-1]]
-    sample_names_list = [i.split(split_sign)[0] for i in files_list]
-    sample_names_list = sorted(list(set(sample_names_list)))
-    for i in sample_names_list:
-        for ii in files_list:
-            if i == ii.split(split_sign)[0] and left_reads_sign in ii:
-                left_name_reads_list.append({
-                    "name": i,
-                    "left_reads": "{0}/{1}".format(files_directory, ii)
-                })
-            elif i == ii.split(split_sign)[0] and right_reads_sign in ii:
-                right_name_reads_list.append({
-                    "name": i,
-                    "right_reads": "{0}/{1}".format(files_directory, ii)
-                })
-            else:
-                pass
-    name_reads = {"left": left_name_reads_list,
-                  "right": right_name_reads_list}
-    return name_reads
+    pairs = index_read_pairs(files_directory,
+                             split_sign=split_sign,
+                             files_extension=files_extension,
+                             left_reads_sign=left_reads_sign,
+                             right_reads_sign=right_reads_sign)["pairs"]
+    return {"left": [{"name": i["name"], "left_reads": i["left_reads"]} for i in pairs],
+            "right": [{"name": i["name"], "right_reads": i["right_reads"]} for i in pairs]}
 
 
-def get_db(url,
+def get_db(url,#pylint: disable=too-many-statements,too-many-branches
            save_path,
-           chunk=8192):
+           chunk=8192,
+           connections=4,
+           part_size=1 << 23,
+           checksum=None,
+           timeout=(10, 60),
+           consumer=None):
     """
     Download from url to file. Handles different chunk sizes saving RAM. Shows
-    progress with tqdm progress bar.
+    progress with tqdm progress bar. If the server accepts byte ranges, the
+    file is downloaded in parts over several connections and the finished
+    parts are recorded, so that an interrupted download is resumed from the
+    partial file. Recorded parts are discarded if the ETag or Last-Modified of
+    the file changed. The file is saved under its final name once complete.
+    Optionally, the file is passed in order to consumer while it is
+    downloaded instead of being saved. Each part is then kept on disk only
+    until consumer read it, at most two parts per connection at once, and
+    the download starts from the beginning if interrupted.
 
     Parameters
     -------
@@ -413,58 +1675,554 @@ def get_db(url,
     chunk: int, default 8192
         Size of chunk the stream is divided to. Smaller it is less memory it
         uses.
+    connections: int, default <4>
+        Number of parts downloaded at once.
+    part_size: int, default <8388608>
+        Size of the parts in bytes.
+    checksum: str, default <None>
+        Expected digest of the file as <algorithm:hexdigest>, e.g.
+        <sha256:...>. Not verified if <None>.
+    timeout: tuple of float, default <(10, 60)>
+        Seconds to wait for the connection and between the bytes received.
+    consumer: function, default <None>
+        Called with file-like object whose read returns the next chunk of the
+        file, as soon as the parts before it are downloaded. If the server
+        does not accept byte ranges, the response is passed straight to
+        consumer. The file is not saved.
+
+    Returns
+    -------
+    int
+        HTTP status code. <200> if the file was downloaded.
+
+    Raises
+    -------
+    IOError
+        If a part is incomplete or the checksum does not match.
+
+    Examples
+    -------
+    >>> import os
+    >>> get_db("http://google.com", "./tests/google.html")
+    200
+    >>> os.path.getsize("./tests/google.html") > 0
+    True
+    """
+    import hashlib
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    import requests as rq
+    from tqdm import tqdm
+    from urllib3.exceptions import HTTPError
+    part_file_name = "{}.part".format(save_path)
+    state_file_name = "{}.part.json".format(save_path)
+    algorithm, _, expected = (checksum or "").partition(":")
+    digest = None
+    saved = True
+
+    def consume(chunks):
+        class Stream(object):#pylint: disable=too-few-public-methods
+            """Downloaded file read in order."""
+            @staticmethod
+            def read(size=-1):#pylint: disable=unused-argument
+                """Read the next chunk."""
+                return next(chunks, b"")
+
+        consumer(Stream())
+        # Read the rest not needed by consumer, e.g. padding of tar archive.
+        for _ in chunks:
+            pass
+
+    head = rq.head(url, allow_redirects=True, timeout=timeout)
+    size = int(head.headers.get("Content-Length") or 0)
+    if head.status_code == 200 and size > 0 and head.headers.get("Accept-Ranges", "").lower() == "bytes":
+        parts = [[i, min(i + part_size, size)] for i in range(0, size, part_size)]
+        state = {"url": url,
+                 "size": size,
+                 "part_size": part_size,
+                 "etag": head.headers.get("ETag"),
+                 "last_modified": head.headers.get("Last-Modified"),
+                 "done": []}
+        if consumer is None:
+            try:
+                with open(state_file_name) as fin:
+                    saved_state = json.load(fin)
+                if (all(saved_state[i] == state[i] for i in ("url", "size", "part_size", "etag", "last_modified")) and
+                        os.path.getsize(part_file_name) == size):
+                    state = saved_state
+            except (IOError, OSError, ValueError, KeyError):
+                pass
+            if not state["done"]:
+                with open(part_file_name, "wb") as fout:
+                    fout.truncate(size)
+        else:
+            saved = False
+            if checksum is not None:
+                digest = hashlib.new(algorithm)
+        lock = threading.Lock()
+        local = threading.local()
+        stop = threading.Event()
+        futures = {}
+        # Parts waiting for consumer are kept on disk, at most two per connection.
+        window = 2 * max(1, int(connections))
+
+        def part_path(index):
+            return "{0}.{1}".format(part_file_name, index)
+
+        def fetch(index):
+            start, end = parts[index]
+            if not hasattr(local, "session"):
+                local.session = rq.Session()
+            headers = {"Range": "bytes={0}-{1}".format(start, end - 1)}
+            # Server sends the whole file instead of the part if it changed meanwhile.
+            if state["etag"] or state["last_modified"]:
+                headers["If-Range"] = state["etag"] or state["last_modified"]
+            res = local.session.get(url,
+                                    headers=headers,
+                                    stream=True,
+                                    timeout=timeout)
+            if res.status_code != 206:
+                raise IOError("Range request refused with response code {}".format(res.status_code))
+            written = 0
+            if consumer is None:
+                fout = open(part_file_name, "r+b")
+                fout.seek(start)
+            else:
+                fout = open(part_path(index), "wb")
+            with fout:
+                for i in res.iter_content(chunk_size=chunk):
+                    if stop.is_set():
+                        raise IOError("Part {0}-{1} cancelled".format(start, end))
+                    fout.write(i)
+                    written += len(i)
+                    progress.update(len(i))
+            if written != end - start:
+                raise IOError("Part {0}-{1} incomplete".format(start, end))
+            if consumer is None:
+                with lock:
+                    state["done"].append(index)
+                    with open("{}.tmp".format(state_file_name), "w") as fout:
+                        json.dump(state, fout)
+                    os.replace("{}.tmp".format(state_file_name), state_file_name)
+
+        def read_parts(executor):
+            for index in range(min(window, len(parts))):
+                futures[index] = executor.submit(fetch, index)
+            for index in range(len(parts)):
+                futures.pop(index).result()
+                with open(part_path(index), "rb") as fin:
+                    for i in iter(lambda: fin.read(chunk), b""):
+                        if digest is not None:
+                            digest.update(i)
+                        yield i
+                os.remove(part_path(index))
+                if index + window < len(parts):
+                    futures[index + window] = executor.submit(fetch, index + window)
+
+        todo = [i for i in range(len(parts)) if i not in state["done"]]
+        try:
+            with tqdm(total=size,
+                      initial=size - sum(parts[i][1] - parts[i][0] for i in todo),
+                      unit="B",
+                      unit_scale=True) as progress:
+                with ThreadPoolExecutor(max_workers=max(1, int(connections))) as executor:
+                    try:
+                        if consumer is not None:
+                            consume(read_parts(executor))
+                        else:
+                            futures.update((i, executor.submit(fetch, i)) for i in todo)
+                            for i in futures.values():
+                                i.result()
+                    except BaseException:
+                        stop.set()
+                        for i in futures.values():
+                            i.cancel()
+                        raise
+        finally:
+            if consumer is not None:
+                for i in range(len(parts)):
+                    if os.path.isfile(part_path(i)):
+                        os.remove(part_path(i))
+    else:
+        res = rq.get(url, stream=True, timeout=timeout)
+        if res.status_code != 200:
+            return res.status_code
+        # Checksum is computed over the file as served, not decoded.
+        res.raw.decode_content = False
+        saved = consumer is None
+        if checksum is not None:
+            digest = hashlib.new(algorithm)
+
+        def read_response():
+            try:
+                for i in res.raw.stream(chunk, decode_content=False):
+                    if digest is not None:
+                        digest.update(i)
+                    progress.update(len(i))
+                    yield i
+            except HTTPError as error:
+                raise IOError(error)
+
+        with tqdm(total=int(res.headers.get("Content-Length") or 0) or None,
+                  unit="B",
+                  unit_scale=True) as progress:
+            if not saved:
+                consume(read_response())
+            else:
+                with open(part_file_name, "wb") as fout:
+                    for i in read_response():
+                        fout.write(i)
+    if checksum is not None:
+        if digest is None:
+            digest = hashlib.new(algorithm)
+            with open(part_file_name, "rb") as fin:
+                for i in iter(lambda: fin.read(1 << 20), b""):
+                    digest.update(i)
+        if digest.hexdigest() != expected.lower():
+            for i in (part_file_name, state_file_name):
+                if os.path.isfile(i):
+                    os.remove(i)
+            raise IOError("{0} checksum of {1} does not match".format(algorithm, url))
+    if saved:
+        os.replace(part_file_name, save_path)
+    if os.path.isfile(state_file_name):
+        os.remove(state_file_name)
+    return 200
+
+
+def read_checksums(input_file_name):
+    """
+    Read expected digests of files from md5sum, sha1sum or sha256sum output.
+    Algorithm is recognized by the digest length.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+
+    Returns
+    -------
+    dict
+        File name as key and <algorithm:hexdigest> as value.
+    """
+    algorithms = {32: "md5", 40: "sha1", 64: "sha256"}
+    checksums = {}
+    with open(input_file_name) as fin:
+        for line in fin:
+            fields = line.split()
+            if len(fields) == 2 and len(fields[0]) in algorithms:
+                checksums[os.path.basename(fields[1].lstrip("*"))] = "{0}:{1}".format(
+                    algorithms[len(fields[0])],
+                    fields[0].lower(),
+                )
+    return checksums
+
+
+def extract_archive(fileobj,
+                    archive_type,
+                    output_directory,
+                    names=None):
+    """
+    Extract archive into directory. Tar archives are read in a single
+    sequential pass so that fileobj can be a network stream. Members which
+    would land outside output_directory are refused.
+
+    Parameters
+    -------
+    fileobj: file-like
+        Archive to read. Needs seek for zip archives.
+    archive_type: str
+        One of <tgz>, <zip>.
+    output_directory: str
+        Directory to extract into.
+    names: list, default <None>
+        List the member names are appended to before each member is
+        extracted, so that they are known if extraction fails. New list if
+        <None>.
 
-    Examples
+    Returns
     -------
-    >>> import os
-    >>> get_db("http://google.com", "./tests/google.html")
-    200
-    >>> os.path.getsize("./tests/google.html") > 0
-    True
+    list of str
+        Names of the extracted members.
+
+    Raises
+    -------
+    tarfile.TarError, zipfile.BadZipfile
+        If the archive is corrupted or a member is refused.
     """
-    res = rq.get(url, stream=True)
-    if res.status_code == 200:
-        with open(save_path, "wb") as fout:
-            for i in tqdm(res.iter_content(chunk_size=chunk)):
-                fout.write(i)
-    return res.status_code
+    import tarfile
+    import zipfile
+    output_directory = os.path.abspath(output_directory)
+
+    def check(name):
+        path = os.path.abspath(os.path.join(output_directory, name))
+        if os.path.commonpath([output_directory, path]) != output_directory:
+            raise tarfile.TarError("Member {} outside of the directory".format(name))
+
+    if names is None:
+        names = []
+    if archive_type == "zip":
+        with zipfile.ZipFile(fileobj) as archive:
+            for i in archive.infolist():
+                check(i.filename)
+                names.append(i.filename)
+                archive.extract(i, output_directory)
+        return names
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for i in archive:
+            check(i.name)
+            if i.issym():
+                check(os.path.join(os.path.dirname(i.name), i.linkname))
+            elif i.islnk():
+                check(i.linkname)
+            names.append(i.name)
+            if hasattr(tarfile, "data_filter"):
+                archive.extract(i, output_directory, filter="data")
+            else:
+                archive.extract(i, output_directory)
+    return names
 
 
-def download(download_directory,#pylint: disable=too-many-arguments
+def download(download_directory,
              filename,
              url,
-             command,
-             input_arg,
-             output_arg):
+             connections=4,
+             checksum=None):
     """
-    Download and unpack specified database into specified directory.
+    Download and unpack specified database into specified directory. Tar
+    archives are extracted straight into the directory while their parts are
+    downloaded and each part is removed once extracted, so the archive is
+    never kept whole on disk. If the download, extraction or checksum fails,
+    the files extracted so far are removed, as the extraction can not be
+    resumed. Zip archives keep their index at the end, so they are downloaded
+    first, resuming an interrupted download, and removed once extracted.
 
     Parameters
     -------
-    db_type: str
-        Database name which determines the download URL and archive type.
     download_directory: str
         Path where the database files would be downloaded.
+    filename: str
+        Archive file name. Its extension determines the archive type.
+    url: str
+        URL to download from.
+    connections: int, default <4>
+        Number of parts downloaded at once.
+    checksum: str, default <None>
+        Expected digest of the archive as <algorithm:hexdigest>.
+
+    Returns
+    -------
+    bool
+        <True> if the database was downloaded and unpacked.
     """
+    import tarfile
+    import zipfile
+    import requests as rq
     download_path = "{}/{}".format(download_directory, filename)
     print("Download path: {}".format(download_path))
     print("Connecting...")
     try:
-        res = get_db(url, download_path)
+        if filename.endswith(".zip"):
+            res = get_db(url, download_path, connections=connections, checksum=checksum)
+            if res == 200:
+                print("Downloading done!")
+                print("Unpacking...")
+                with open(download_path, "rb") as fin:
+                    extract_archive(fin, "zip", download_directory)
+                os.remove(download_path)
+        else:
+            print("Downloading and unpacking...")
+            extracted = []
+            try:
+                res = get_db(url,
+                             download_path,
+                             chunk=1 << 20,
+                             connections=connections,
+                             checksum=checksum,
+                             consumer=lambda fileobj: extract_archive(fileobj,
+                                                                      "tgz",
+                                                                      download_directory,
+                                                                      names=extracted))
+            except BaseException:
+                # Remove the files, then the directories left empty, deepest first.
+                paths = set()
+                for i in extracted:
+                    i = os.path.normpath(i)
+                    while i not in ("", "."):
+                        paths.add(i)
+                        i = os.path.dirname(i)
+                for i in sorted(paths, key=lambda x: x.count(os.sep), reverse=True):
+                    path = os.path.join(download_directory, i)
+                    if os.path.islink(path) or os.path.isfile(path):
+                        os.remove(path)
+                    elif os.path.isdir(path) and not os.listdir(path):
+                        os.rmdir(path)
+                raise
         if res == 200:
-            print("Downloading done!")
-            print("Unpacking...")
-            os.system("{} {} {} {} {}".format(command,
-                                              input_arg,
-                                              download_path,
-                                              output_arg,
-                                              download_directory))
-            os.system("rm {}".format(download_path))
             print("Unpacking done!")
-        else:
-            print("Failed to establish connection. Response code {}".format(res))
-    except rq.exceptions.ConnectionError:
-        print("Failed to establish connection.")
+            return True
+        print("Failed to establish connection. Response code {}".format(res))
+    except (tarfile.TarError, zipfile.BadZipfile) as error:
+        print("Unpacking failed: {}".format(error))
+        # Archive is complete but broken, so it is not resumed next time.
+        for i in (download_path, "{}.part".format(download_path), "{}.part.json".format(download_path)):
+            if os.path.isfile(i):
+                os.remove(i)
+    except (rq.exceptions.RequestException, IOError) as error:
+        print("Download failed: {}.".format(error))
+        if os.path.isfile("{}.part.json".format(download_path)):
+            print("Run again to resume.")
+    return False
+
+
+def import_pyplot(backend="Agg"):
+    """
+    Import matplotlib.pyplot with non-interactive backend set beforehand.
+
+    Parameters
+    -------
+    backend: str, default <Agg>
+        matplotlib backend to use.
+
+    Returns
+    -------
+    module
+        matplotlib.pyplot
+    """
+    import matplotlib
+    matplotlib.use(backend)
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def save_figure_html(fig,
+                     output_file_name,
+                     assets_dir=None,
+                     image_format="png"):
+    """
+    Save figure as html fragment with single img tag. The image is embedded
+    as base64 png by default. Otherwise it is written to assets_dir under the
+    name made of its content hash, so that unchanged figures are saved once
+    and shared between the reports. The img tag then refers to the file and
+    is loaded lazily.
+
+    Parameters
+    -------
+    fig: matplotlib.figure.Figure
+        Figure to save. Closed afterwards.
+    output_file_name: str
+        Output file name.
+    assets_dir: str, default <None>
+        Directory for the image files. The image file name is used as the img
+        src, so a relative directory must be relative to the working
+        directory of the report rendering, not to output_file_name. Image is
+        embedded in the html fragment if <None>.
+    image_format: str, default <png>
+        Format of the image file. One of png, webp, svg.
+
+    Returns
+    -------
+    str
+        Image file name or <None> if the image is embedded.
+    """
+    import hashlib
+    plt = import_pyplot()
+    buf = BytesIO()
+    if assets_dir is None:
+        fig.savefig(buf, format="png")
+        plt.close(fig)
+        encoded = base64.b64encode(buf.getvalue()).decode('utf-8')
+        html = '<img src=\'data:image/png;base64,{}\'>'.format(encoded)
+        with open(output_file_name, "w") as fout:
+            fout.write(html)
+        return None
+    # Keep the images reproducible so that the hash changes with the content only.
+    if image_format == "svg":
+        with plt.rc_context({"svg.hashsalt": "mothulity"}):
+            fig.savefig(buf, format="svg", metadata={"Date": None})
+    elif image_format == "png":
+        fig.savefig(buf, format="png", pil_kwargs={"optimize": True})
+    else:
+        fig.savefig(buf, format=image_format)
+    plt.close(fig)
+    image = buf.getvalue()
+    image_file_name = "{0}/{1}.{2}".format(
+        assets_dir.rstrip("/"),
+        hashlib.sha256(image).hexdigest()[:16],
+        image_format,
+    )
+    if not os.path.exists(image_file_name):
+        os.makedirs(assets_dir, exist_ok=True)
+        temp_file_name = "{0}.{1}.tmp".format(image_file_name, os.getpid())
+        with open(temp_file_name, "wb") as fout:
+            fout.write(image)
+        os.replace(temp_file_name, image_file_name)
+    html = '<img src=\'{}\' loading=\'lazy\'>'.format(image_file_name)
+    with open(output_file_name, "w") as fout:
+        fout.write(html)
+    return image_file_name
+
+
+def lttb_mask(x, y, max_points=1000):
+    """
+    Select points of each curve with largest-triangle-three-buckets
+    downsampling. Curves share the x values and are sliced into the same
+    buckets. Missing values end the curve and are never selected.
+
+    Parameters
+    -------
+    x: numpy.ndarray
+        Ascending x values, shape points.
+    y: numpy.ndarray
+        Y values, shape points x curves.
+    max_points: int, default <1000>
+        Maximum number of points selected from each curve.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean mask of the selected points, shape points x curves.
+
+    Examples
+    -------
+    >>> import numpy as np
+    >>> x = np.arange(7, dtype=float)
+    >>> y = np.array([[0], [0], [0], [5], [0], [0], [0]], dtype=float)
+    >>> np.flatnonzero(lttb_mask(x, y, 3)[:, 0]).tolist()
+    [0, 3, 6]
+    """
+    import warnings
+    import numpy as np
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    points_num, curves_num = y.shape
+    mask = np.zeros(y.shape, dtype=bool)
+    if points_num <= max_points or max_points < 3:
+        return valid
+    cols = np.arange(curves_num)
+    every = (points_num - 2) / (max_points - 2)
+    edges = np.floor(np.arange(max_points - 1) * every).astype(int) + 1
+    edges[-1] = points_num - 1
+    selected = np.zeros(curves_num, dtype=int)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        for start, end, next_end in zip(edges[:-1], edges[1:], np.append(edges[2:], points_num)):
+            next_x = x[end:next_end].mean()
+            next_y = np.nanmean(y[end:next_end], axis=0)
+            prev_x = x[selected]
+            prev_y = y[selected, cols]
+            areas = np.abs((prev_x - next_x) * (y[start:end] - prev_y) -
+                           (prev_x - x[start:end, None]) * (next_y - prev_y))
+            areas[np.isnan(areas)] = -1
+            selected = areas.argmax(axis=0) + start
+            mask[selected, cols] = True
+    mask[0] = True
+    mask[-1] = True
+    has_values = valid.any(axis=0)
+    mask[valid.argmax(axis=0)[has_values], cols[has_values]] = True
+    mask[points_num - 1 - valid[::-1].argmax(axis=0)[has_values], cols[has_values]] = True
+    return mask & valid
 
 
 def draw_rarefaction(input_file_name,#pylint: disable=too-many-arguments,too-many-locals
@@ -474,9 +2232,14 @@ def draw_rarefaction(input_file_name,#pylint: disable=too-many-arguments,too-man
                      xlabel="number of sequences",
                      index_col="numsampled",
                      figsize=(15, 8),
-                     sep="\t"):
+                     sep="\t",
+                     max_points=1000,
+                     assets_dir=None,
+                     image_format="png"):
     """
     Draw rarefaction plot from mothur's rarefaction file and save figure to file.
+    Curves longer than max_points are downsampled with
+    largest-triangle-three-buckets before drawing.
 
     Parameters
      -------
@@ -496,38 +2259,139 @@ def draw_rarefaction(input_file_name,#pylint: disable=too-many-arguments,too-man
         Size of figure to be saved.
     sep: str, default <\t>
         Delimiter to use for reading-in rarefaction file.
+    max_points: int, default <1000>
+        Maximum number of points drawn per curve.
+    assets_dir: str, default <None>
+        Directory for the image file. Image is embedded in the html if <None>.
+    image_format: str, default <png>
+        Format of the image file. One of png, webp, svg.
     """
-    df = read_csv(input_file_name,
-                  sep=sep,
-                  index_col=index_col)
+    plt = import_pyplot()
+    df = read_table(input_file_name,
+                    sep=sep,
+                    index_col=index_col)
     cols = [i for i in df.columns if "lci" not in i]
     cols = [i for i in cols if "hci" not in i]
     df = df[cols]
-    _, ax = plt.subplots()
-    df[cols].plot(ax=ax,
-                  figsize=figsize)
-    plt.grid(True)
-    plt.title(title)
-    plt.ylabel(ylabel)
-    plt.xlabel(xlabel)
-    # Embed the result in the html output.
-    buf = BytesIO()
-    plt.savefig(buf, format="png")
-    encoded = base64.b64encode(buf.getvalue()).decode('utf-8')
-    html = '<img src=\'data:image/png;base64,{}\'>'.format(encoded)
-    with open(output_file_name, "w") as fout:
-        fout.write(html)
+    x = df.index.values.astype(float)
+    y = df.values.astype(float)
+    mask = lttb_mask(x, y, max_points)
+    fig, ax = plt.subplots(figsize=figsize)
+    for i, col in enumerate(cols):
+        ax.plot(x[mask[:, i]], y[mask[:, i], i], label=col)
+    ax.legend()
+    ax.grid(True)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    ax.set_xlabel(xlabel)
+    save_figure_html(fig,
+                     output_file_name,
+                     assets_dir=assets_dir,
+                     image_format=image_format)
+
+
+def read_phylip_matrix(input_file_name,
+                       sep="\t"):
+    """
+    Read mothur's square phylip file into float32 distance matrix, row by row.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    sep: str, default <\t>
+        Delimiter to use for reading-in phylip file.
+
+    Returns
+    -------
+    tuple of list and numpy.ndarray
+        Sample names and samples x samples distance matrix.
+    """
+    import numpy as np
+    with open(input_file_name) as fin:
+        samples_num = int(fin.readline().strip())
+        names = []
+        matrix = np.zeros((samples_num, samples_num), dtype=np.float32)
+        for i, line in enumerate(fin):
+            row = line.rstrip("\r\n").split(sep)
+            names.append(row[0])
+            matrix[i] = np.array(row[1:samples_num + 1], dtype=np.float32)
+    return names, matrix
+
+
+def cluster_order(matrix):
+    """
+    Get order of the samples from average linkage (UPGMA) hierarchical
+    clustering of the distance matrix. Nearest neighbour of each cluster is
+    kept between the merges and found again only for the clusters whose
+    neighbour was merged, so each merge costs about one pass over the matrix
+    row instead of a search of the whole matrix.
+
+    Parameters
+    -------
+    matrix: numpy.ndarray
+        Square distance matrix.
 
+    Returns
+    -------
+    list of int
+        Samples indices, clustered samples next to each other.
 
-def draw_heatmap(input_file_name,
+    Examples
+    -------
+    >>> import numpy as np
+    >>> cluster_order(np.array([[0, 9, 1, 8], [9, 0, 8, 2], [1, 8, 0, 9], [8, 2, 9, 0]]))
+    [0, 2, 1, 3]
+    """
+    import numpy as np
+    dist = np.array(matrix, dtype=np.float64)
+    samples_num = len(dist)
+    if samples_num == 0:
+        return []
+    np.fill_diagonal(dist, np.inf)
+    sizes = np.ones(samples_num)
+    members = [[i] for i in range(samples_num)]
+    alive = np.ones(samples_num, dtype=bool)
+    nearest = np.argmin(dist, axis=1)
+    nearest_dist = dist[np.arange(samples_num), nearest]
+    for _ in range(samples_num - 1):
+        i = int(np.argmin(nearest_dist))
+        i, j = sorted((i, int(nearest[i])))
+        merged = (dist[i] * sizes[i] + dist[j] * sizes[j]) / (sizes[i] + sizes[j])
+        dist[i] = merged
+        dist[:, i] = merged
+        dist[i, i] = np.inf
+        dist[j] = np.inf
+        dist[:, j] = np.inf
+        sizes[i] += sizes[j]
+        members[i] += members[j]
+        members[j] = []
+        alive[j] = False
+        nearest_dist[j] = np.inf
+        stale = alive & ((nearest == i) | (nearest == j) | (merged <= nearest_dist))
+        stale[i] = True
+        rows = np.flatnonzero(stale)
+        nearest[rows] = np.argmin(dist[rows], axis=1)
+        nearest_dist[rows] = dist[rows, nearest[rows]]
+    return [k for i in members for k in i]
+
+
+def draw_heatmap(input_file_name,#pylint: disable=too-many-arguments,too-many-locals
                  output_file_name,
                  sep="\t",
                  skiprows=1,
                  header=None,
                  index_col=0,
-                 color_map="plasma"):
+                 color_map="plasma",
+                 raster=None,
+                 raster_min_size=100,
+                 cluster=False,
+                 max_labels=50,
+                 max_pixels=1000):
     """
-    Draw heatmap from mothur's phylip file and save figure to file.
+    Draw heatmap from mothur's phylip file and save figure to file. Big
+    matrices are drawn as a single raster image with thinned tick labels
+    instead of a patch and a label per cell.
 
     Parameters
     -------
@@ -545,23 +2409,204 @@ def draw_heatmap(input_file_name,
         Index column name in shared file.
     color_map: str, default <plasma>
         Color map to use in the figure.
+    raster: bool, default <None>
+        Draw matrix as a single raster image. Used if the matrix has more than
+        raster_min_size samples if <None>.
+    raster_min_size: int, default <100>
+        Number of samples above which the matrix is drawn as raster image if
+        raster is <None>.
+    cluster: bool, default <False>
+        Reorder samples by average linkage hierarchical clustering.
+    max_labels: int, default <50>
+        Maximum number of tick labels on each axis of raster image.
+    max_pixels: int, default <1000>
+        Maximum number of pixels on each axis of raster image. Bigger matrices
+        are averaged in blocks.
     """
-    df = read_csv(input_file_name,
-                  sep=sep,
-                  skiprows=skiprows,
-                  header=header,
-                  index_col=index_col)
+    if raster is None:
+        with open(input_file_name) as fin:
+            raster = int(fin.readline().strip()) > raster_min_size
+    if raster is True:
+        import numpy as np
+        plt = import_pyplot()
+        names, matrix = read_phylip_matrix(input_file_name, sep=sep)
+        if cluster is True:
+            order = cluster_order(matrix)
+            matrix = matrix[np.ix_(order, order)]
+            names = [names[i] for i in order]
+        samples_num = len(names)
+        block = -(-samples_num // max_pixels)
+        if block > 1:
+            padded_num = -(-samples_num // block) * block
+            padded = np.full((padded_num, padded_num), np.nan, dtype=np.float32)
+            padded[:samples_num, :samples_num] = matrix
+            matrix = np.nanmean(padded.reshape(padded_num // block,
+                                               block,
+                                               padded_num // block,
+                                               block), axis=(1, 3))
+        step = max(1, -(-samples_num // max_labels))
+        ticks = list(range(0, samples_num, step))
+        fig, ax = plt.subplots(figsize=(8, 8))
+        image = ax.imshow(matrix,
+                          cmap=color_map,
+                          interpolation="nearest",
+                          extent=(-0.5, samples_num - 0.5, samples_num - 0.5, -0.5))
+        ax.set_xticks(ticks)
+        ax.set_xticklabels([names[i] for i in ticks], rotation=90, fontsize="x-small")
+        ax.set_yticks(ticks)
+        ax.set_yticklabels([names[i] for i in ticks], fontsize="x-small")
+        fig.colorbar(image, ax=ax, fraction=0.046, pad=0.04)
+        fig.tight_layout()
+        fig.savefig(output_file_name)
+        plt.close(fig)
+        return
+    plt = import_pyplot()
+    from seaborn import heatmap
+    df = read_table(input_file_name,
+                    sep=sep,
+                    skiprows=skiprows,
+                    header=header,
+                    index_col=index_col)
     df.index.name = None
     df.columns = df.index
-    fig = heatmap(df, square=True, cmap=color_map).get_figure()
+    if cluster is True:
+        order = cluster_order(df.values)
+        df = df.iloc[order, order]
+    fig, ax = plt.subplots()
+    heatmap(df, square=True, cmap=color_map, ax=ax)
     fig.savefig(output_file_name)
+    plt.close(fig)
+
+
+def read_newick(input_file_name):
+    """
+    Read tree from newick file into flat arrays. Nodes are numbered in the
+    order of appearance, so each node comes after its parent.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+
+    Returns
+    -------
+    dict
+        <names>: list of str, nodes names, empty for unnamed nodes.
+        <parents>: numpy.ndarray of int, parent node indices, -1 for root.
+        <lengths>: numpy.ndarray of float, branch lengths, 0 if not specified.
+
+    Examples
+    -------
+    >>> tree = read_newick("./tests/test.tre")
+    >>> tree["names"]
+    ['', '', 'S0', 'S1', 'S2']
+    >>> tree["parents"].tolist()
+    [-1, 0, 1, 1, 0]
+    >>> tree["lengths"].tolist()
+    [0.0, 0.05, 0.1, 0.2, 0.4]
+    """
+    import numpy as np
+    with open(input_file_name) as fin:
+        newick = fin.read()
+    names = [""]
+    parents = [-1]
+    lengths = [0.0]
+    current = 0
+    pos = 0
+    token_end = "(),:;["
+    while pos < len(newick):
+        char = newick[pos]
+        if char == "(":
+            names.append("")
+            parents.append(current)
+            lengths.append(0.0)
+            current = len(names) - 1
+            pos += 1
+        elif char == ",":
+            current = parents[current]
+            names.append("")
+            parents.append(current)
+            lengths.append(0.0)
+            current = len(names) - 1
+            pos += 1
+        elif char == ")":
+            current = parents[current]
+            pos += 1
+        elif char == ":":
+            end = pos + 1
+            while end < len(newick) and newick[end] not in token_end:
+                end += 1
+            lengths[current] = float(newick[pos + 1:end])
+            pos = end
+        elif char == "[":
+            pos = newick.index("]", pos) + 1
+        elif char == ";":
+            break
+        elif char.isspace():
+            pos += 1
+        else:
+            end = pos
+            while end < len(newick) and newick[end] not in token_end:
+                end += 1
+            names[current] = newick[pos:end].strip().strip("'\"")
+            pos = end
+    return {"names": names,
+            "parents": np.array(parents, dtype=np.int32),
+            "lengths": np.array(lengths, dtype=np.float64)}
+
+
+def tree_layout(tree):
+    """
+    Get dendrogram coordinates of the tree nodes. Distance from root is summed
+    by pointer jumping and internal nodes are placed level by level, instead of
+    walking the tree node by node.
+
+    Parameters
+    -------
+    tree: dict
+        Tree from mothulity.utilities.read_newick.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Nodes x coordinates (distance from root), y coordinates (leaf order,
+        internal nodes in the middle of their children) and depths.
+    """
+    import numpy as np
+    parents = tree["parents"]
+    nodes_num = len(parents)
+    x = tree["lengths"].copy()
+    depths = (parents >= 0).astype(np.int32)
+    ancestors = parents.copy()
+    while (ancestors >= 0).any():
+        jump = ancestors >= 0
+        x[jump] += x[ancestors[jump]]
+        depths[jump] += depths[ancestors[jump]]
+        ancestors[jump] = ancestors[ancestors[jump]]
+    x -= x[0]
+    is_leaf = np.ones(nodes_num, dtype=bool)
+    is_leaf[parents[parents >= 0]] = False
+    y = np.full(nodes_num, np.nan)
+    y[is_leaf] = np.arange(is_leaf.sum())
+    y_min = np.where(is_leaf, y, np.inf)
+    y_max = np.where(is_leaf, y, -np.inf)
+    for depth in range(depths.max(), 0, -1):
+        nodes = np.flatnonzero(depths == depth)
+        internal = nodes[~is_leaf[nodes]]
+        y[internal] = (y_min[internal] + y_max[internal]) / 2
+        np.minimum.at(y_min, parents[nodes], y[nodes])
+        np.maximum.at(y_max, parents[nodes], y[nodes])
+    if not is_leaf[0]:
+        y[0] = (y_min[0] + y_max[0]) / 2
+    return x, y, depths
 
 
 def draw_tree(input_file_name,
               output_file_name,
-              tree_format="newick"):
+              max_labels=200):
     """
-    Draw dendrogram from mothur's tre file and save figure to file.
+    Draw dendrogram from mothur's tre file and save figure to file. All the
+    branches are drawn as a single collection of lines.
 
     Parameters
     -------
@@ -569,13 +2614,43 @@ def draw_tree(input_file_name,
         Input file name.
     output_file_name: str
         Output file name.
-    tree_format: str, default <newick>
-        File format of dendrogram.
+    max_labels: int, default <200>
+        Maximum number of leaf labels. Labels are thinned above this number.
     """
-    pylab.ion()
-    tree = ph.read(input_file_name, tree_format)
-    ph.draw(tree)
-    pylab.savefig(output_file_name)
+    import numpy as np
+    from matplotlib.collections import LineCollection
+    plt = import_pyplot()
+    tree = read_newick(input_file_name)
+    parents = tree["parents"]
+    x, y, _ = tree_layout(tree)
+    children = np.flatnonzero(parents >= 0)
+    horizontal = np.stack([np.column_stack([x[parents[children]], y[children]]),
+                           np.column_stack([x[children], y[children]])], axis=1)
+    internal = np.unique(parents[children])
+    y_min = np.full(len(parents), np.inf)
+    y_max = np.full(len(parents), -np.inf)
+    np.minimum.at(y_min, parents[children], y[children])
+    np.maximum.at(y_max, parents[children], y[children])
+    vertical = np.stack([np.column_stack([x[internal], y_min[internal]]),
+                         np.column_stack([x[internal], y_max[internal]])], axis=1)
+    leaves = np.setdiff1d(np.arange(len(parents)), internal)
+    fig, ax = plt.subplots(figsize=(6.4, min(max(4.8, 0.15 * min(len(leaves), max_labels)), 48)))
+    ax.add_collection(LineCollection(np.concatenate([horizontal, vertical]),
+                                     colors="black",
+                                     linewidths=1))
+    step = max(1, -(-len(leaves) // max_labels))
+    x_pad = x.max() * 0.01
+    for leaf in leaves[::step]:
+        ax.text(x[leaf] + x_pad, y[leaf], tree["names"][leaf], va="center")
+    ax.set_xlim(0, x.max() * 1.15 if x.max() > 0 else 1)
+    ax.set_ylim(len(leaves) - 0.2, -0.8)
+    ax.set_yticks([])
+    ax.set_xlabel("branch length")
+    ax.set_ylabel("taxa")
+    ax.spines["top"].set_visible(False)
+    ax.spines["right"].set_visible(False)
+    fig.savefig(output_file_name)
+    plt.close(fig)
 
 
 def draw_scatter(input_file_name,
@@ -590,9 +2665,14 @@ def draw_scatter(input_file_name,
                  grid_color="white",
                  grid_style="solid",
                  backgroud_color="#EEEEEE",#pylint: disable=unused-argument
-                 sep="\t"):
+                 sep="\t",
+                 max_legend=10,
+                 assets_dir=None,
+                 image_format="png"):
     """
-    Draw scatter plot from mothur's axes file and save figure to file.
+    Draw scatter plot from mothur's axes file and save figure to file. All the
+    points are drawn at once, colored by group in order of appearance in the
+    axes file.
 
     Parameters
     -------
@@ -622,32 +2702,53 @@ def draw_scatter(input_file_name,
         Color of the plot backgroud.
     sep: str, default <\t>
         Delimiter to use for reading-in axes file.
+    max_legend: int, default <10>
+        Maximum number of groups in the legend. The rest is summed up in the
+        last legend entry.
+    assets_dir: str, default <None>
+        Directory for the image file. Image is embedded in the html if <None>.
+    image_format: str, default <png>
+        Format of the image file. One of png, webp, svg.
     """
-    df = read_csv(input_file_name,
-                  sep=sep,
-                  index_col=group_col)
-    _, ax = plt.subplots()
-    variants = set(df.index.values)
-    for i, variant in enumerate(variants):
-        x = np.array(df.loc[variant][axis1_col])
-        y = np.array(df.loc[variant][axis2_col])
-        ax.scatter(x,
-                   y,
-                   s=point_size,
-                   label=variant,
-                   alpha=point_alpha,
-                   cmap=plt.cm.jet(i))#pylint: disable=no-member
-
-    ax.legend()
+    import numpy as np
+    import pandas as pd
+    from matplotlib.lines import Line2D
+    plt = import_pyplot()
+    df = read_table(input_file_name,
+                    sep=sep,
+                    index_col=group_col)
+    codes, variants = pd.factorize(df.index)
+    if len(variants) <= 10:
+        colors = np.array([plt.cm.tab10(i) for i in range(len(variants))])#pylint: disable=no-member
+    else:
+        colors = plt.cm.jet(np.linspace(0, 1, len(variants)))#pylint: disable=no-member
+    fig, ax = plt.subplots()
+    ax.scatter(df[axis1_col].values,
+               df[axis2_col].values,
+               s=point_size,
+               c=colors[codes],
+               alpha=point_alpha)
+    handles = [Line2D([],
+                      [],
+                      marker="o",
+                      linestyle="",
+                      markersize=point_size ** 0.5,
+                      color=colors[i],
+                      alpha=point_alpha,
+                      label=variant)
+               for i, variant in enumerate(variants[:max_legend])]
+    if len(variants) > max_legend:
+        handles.append(Line2D([],
+                              [],
+                              linestyle="",
+                              label="+{} more".format(len(variants) - max_legend)))
+    ax.legend(handles=handles)
     ax.grid(color=grid_color, linestyle=grid_style)
     ax.set_title(title_text, size=title_size)
-    # Embed the result in the html output.
-    buf = BytesIO()
-    plt.savefig(buf, format="png")
-    encoded = base64.b64encode(buf.getvalue()).decode('utf-8')
-    html = '<img src=\'data:image/png;base64,{}\'>'.format(encoded)
-    with open(output_file_name, "w") as fout:
-        fout.write(html)
+    save_figure_html(fig,
+                     output_file_name,
+                     assets_dir=assets_dir,
+                     image_format=image_format)
 
 
 def summary2html(input_file_name,#pylint: disable=dangerous-default-value
@@ -657,7 +2758,8 @@ def summary2html(input_file_name,#pylint: disable=dangerous-default-value
                  css_classes=["compact",
                               "hover",
                               "order-column"],
-                 sep="\t"):
+                 sep="\t",
+                 json_data=False):
     """
     Convert raw mothur's summary table file into fancy HTML.
 
@@ -675,12 +2777,28 @@ def summary2html(input_file_name,#pylint: disable=dangerous-default-value
         CSS classes for displaying summary table.
     sep: str, default <\t>
         Delimiter to use for reading-in axes file.
+    json_data: bool, default <False>
+        Write only the table header and pass the rows to DataTables as JSON
+        column arrays. Rows are rendered by the browser page by page.
     """
     with open(js_input_file_name) as fin:
         js_str = fin.read()
-    df = read_csv(input_file_name, sep=sep)
-    html_df = df.to_html(classes=css_classes,
-                         index=False)
+    df = read_table(input_file_name, sep=sep)
+    if json_data is True:
+        html_df = df.iloc[:0].to_html(classes=css_classes,
+                                      index=False)
+        columns = ",".join(df[i].to_json(orient="values") for i in df.columns)
+        data_str = '{{"columns":{0},"data":[{1}]}}'.format(
+            json.dumps([str(i) for i in df.columns]),
+            columns,
+        ).replace("</", "<\\/")
+        html_df = '{0}<script type="application/json" id="summary-data">{1}</script>'.format(
+            html_df,
+            data_str,
+        )
+    else:
+        html_df = df.to_html(classes=css_classes,
+                             index=False)
     html_str = "{0}{1}{2}".format(css_link,
                                   html_df,
                                   js_str).encode("utf-8")
@@ -746,6 +2864,7 @@ def populate_node(df,
     taxlevel_col: str
         Taxonomical level column name in node's daughter pandas.DataFrame.
     """
+    from lxml import etree as et
     node_tax_name = node.attrib["name"]
     node_rank = node.attrib["rankID"]
     children = get_daughter_df(df,
@@ -761,12 +2880,68 @@ def populate_node(df,
                           taxlevel=str(getattr(i, taxlevel_col)))
 
 
+def get_daughters_map(df,
+                      taxon_col="taxon",
+                      rankID_col="rankID",
+                      taxlevel_col="taxlevel",
+                      rank_sep="."):
+    """
+    Group taxa from mothur's tax.summary file by their mother taxon rankID in
+    a single pass. Order of the rows within each group is preserved.
+
+    Parameters
+    -------
+    df: pandas.DataFrame
+        pandas.DataFrame read from mothur's tax.summary file.
+    taxon_col: str
+        Taxon column name in pandas.DataFrame.
+    rankID_col: str
+        rank ID column name in pandas.DataFrame.
+    taxlevel_col: str
+        Taxonomical level column name in pandas.DataFrame.
+    rank_sep: str, default <.>
+        Separator of the rankID levels.
+
+    Returns
+    -------
+    dict of lists
+        Mother rankID as keys and lists of (taxon, rankID, taxlevel) tuples of
+        str as values.
+
+    Examples
+    -------
+    >>> import pandas as pd
+    >>> df = pd.DataFrame({"taxlevel": [0, 1, 2, 1],\
+    "rankID": ["0", "0.1", "0.1.1", "0.2"],\
+    "taxon": ["Root", "Bacteria", "Firmicutes", "Archaea"]})
+    >>> daughters = get_daughters_map(df)
+    >>> daughters["0"]
+    [('Bacteria', '0.1', '1'), ('Archaea', '0.2', '1')]
+    >>> daughters["0.1"]
+    [('Firmicutes', '0.1.1', '2')]
+    """
+    daughters = {}
+    for taxon, rank_id, tax_level in zip(df[taxon_col],
+                                         df[rankID_col],
+                                         df[taxlevel_col]):
+        rank_id = str(rank_id)
+        if rank_sep not in rank_id:
+            continue
+        mother_rank = rank_id.rsplit(rank_sep, 1)[0]
+        daughters.setdefault(mother_rank, []).append((str(taxon),
+                                                      rank_id,
+                                                      str(tax_level)))
+    return daughters
+
+
 def populate_tree(df,
                   nodes_root,
-                  tax_levels):
+                  rankID_attrib="rankID",
+                  node_tag="node"):
     """
-    Populate whole xml structure with daughter nodes using
-    mothulity_draw.populate_node.
+    Populate whole xml structure with daughter nodes. Daughter taxa are
+    grouped by mother rankID with mothulity.utilities.get_daughters_map so the
+    whole hierarchy is attached in linear time.
 
     Parameters
     -------
@@ -774,15 +2949,65 @@ def populate_tree(df,
         pandas.DataFrame read from mothur's tax.summary file.
     nodes_root: lxml.etree._Element
         Node from which populating will start.
-    tax_levels: list
-        Taxon taxonomical level values list.
+    rankID_attrib: str, default <rankID>
+        rankID attribute name in node.
+    node_tag: str, default <node>
+        Tag of the created daughter nodes.
+    """
+    from lxml import etree as et
+    daughters = get_daughters_map(df)
+    nodes_stack = [nodes_root]
+    while nodes_stack:
+        node = nodes_stack.pop()
+        for taxon, rank_id, tax_level in daughters.get(node.attrib[rankID_attrib], []):
+            nodes_stack.append(et.SubElement(node,
+                                             node_tag,
+                                             name=taxon,
+                                             rankID=rank_id,
+                                             taxlevel=tax_level))
+
+
+def get_counts_map(df,
+                   groups,
+                   taxon_col="taxon",
+                   rankID_col="rankID",
+                   taxlevel_col="taxlevel"):
+    """
+    Index per-group counts of mothur's tax.summary file by taxon, taxlevel and
+    rankID. The count matrix is sliced from the pandas.DataFrame only once.
+
+    Parameters
+    -------
+    df: pandas.DataFrame
+        pandas.DataFrame read from mothur's tax.summary file.
+    groups: list of str
+        Group column names in pandas.DataFrame.
+    taxon_col: str
+        Taxon column name in pandas.DataFrame.
+    rankID_col: str
+        rank ID column name in pandas.DataFrame.
+    taxlevel_col: str
+        Taxonomical level column name in pandas.DataFrame.
+
+    Returns
+    -------
+    dict of lists
+        (taxon, taxlevel, rankID) tuples of str as keys and lists of counts,
+        ordered as groups, as values.
+
+    Examples
+    -------
+    >>> import pandas as pd
+    >>> df = pd.DataFrame({"taxlevel": [0, 1], "rankID": ["0", "0.1"],\
+    "taxon": ["Root", "Bacteria"], "A": [5, 5], "B": [3, 2]})
+    >>> counts = get_counts_map(df, ["A", "B"])
+    >>> counts[("Bacteria", "1", "0.1")]
+    [5, 2]
     """
-    check_list = []
-    for tax_level in tax_levels:
-        for i in nodes_root.iter():
-            if i not in check_list:
-                populate_node(df, i, tax_level)
-            check_list.append(i)
+    keys = zip(df[taxon_col].astype(str),
+               df[taxlevel_col].astype(str),
+               df[rankID_col].astype(str))
+    return dict(zip(keys, df[groups].values.tolist()))
 
 
 def populate_count(df,
@@ -795,7 +3020,8 @@ def populate_count(df,
                    rankID_attrib="rankID",
                    taxlevel_attrib="taxlevel"):
     """
-    Populate each taxonomical node with count values.
+    Populate each taxonomical node with count values. Counts are looked up in
+    an index built once with mothulity.utilities.get_counts_map.
 
     Parameters
     -------
@@ -803,6 +3029,8 @@ def populate_count(df,
         pandas.DataFrame read from mothur's tax.summary file.
     nodes_root: lxml.etree._Element
         Node from which populating will start.
+    groups: list of str
+        Group column names in corresponding pandas.DataFrame.
     taxon_col: str
         Taxon column name in corresponding pandas.DataFrame.
     rankID_col: str
@@ -815,13 +3043,29 @@ def populate_count(df,
         rankID attribute name in node.
     taxlevel_attrib: str
         taxlevel attribute name in node.
+
+    Raises
+    -------
+    ValueError
+        If a node has no matching row in the tax.summary file.
     """
-    for i in nodes_root.iter():
+    from lxml import etree as et
+    counts = get_counts_map(df,
+                            groups,
+                            taxon_col=taxon_col,
+                            rankID_col=rankID_col,
+                            taxlevel_col=taxlevel_col)
+    for i in list(nodes_root.iter()):
         if len(i.attrib) >= 3:
-            sel_df = df[(df[taxon_col] == i.attrib[taxon_attrib]) &
-                        (df[taxlevel_col] == int(i.attrib[taxlevel_attrib])) &
-                        (df[rankID_col] == i.attrib[rankID_attrib])]
-            values = sel_df[groups].values.tolist()[0]
+            key = (i.attrib[taxon_attrib],
+                   i.attrib[taxlevel_attrib],
+                   i.attrib[rankID_attrib])
+            try:
+                values = counts[key]
+            except KeyError:
+                raise ValueError(
+                    "No counts found for taxon {0} (taxlevel {1}, rankID {2})".format(*key)
+                ) from None
             count_elem = et.SubElement(i, "count")
             for ii in values:
                 et.SubElement(count_elem, "val").text = str(ii)
@@ -854,9 +3098,9 @@ def constr_krona_xml(input_file_name,#pylint: disable=dangerous-default-value
     sep: str, default <\t>
         Separator in input file.
     """
-    df = pd.read_csv(input_file_name, sep=sep)
+    from lxml import etree as et
+    df = read_table(input_file_name, sep=sep, dtype={"rankID": "str"})
     groups_list = list(df.columns[5:])
-    tax_lev_list = list(df.taxlevel.drop_duplicates())
     root = et.Element(root_tag)
     attributes = et.SubElement(root, attributes_tag, attributes_dict)
     attribute = et.SubElement(attributes, attribute_tag, attribute_dict)
@@ -866,8 +3110,7 @@ def constr_krona_xml(input_file_name,#pylint: disable=dangerous-default-value
         et.SubElement(datasets, dataset_tag).text = i
     root_node = et.SubElement(root, root_node_tag, root_node_dict)
     populate_tree(df,
-                  root_node,
-                  tax_lev_list)
+                  root_node)
     populate_count(df,
                    root_node,
                    groups_list)
@@ -877,6 +3120,371 @@ def constr_krona_xml(input_file_name,#pylint: disable=dangerous-default-value
                         xml_declaration=True,
                         encoding="utf-8")
 
+
+def stream_krona_xml(input_file_name,#pylint: disable=dangerous-default-value,too-many-statements
+                     output_file_name,
+                     sep="\t",
+                     root_tag="krona",
+                     attributes_tag="attributes",
+                     attribute_tag="attribute",
+                     attribute_text="count",
+                     datasets_tag="datasets",
+                     dataset_tag="dataset",
+                     root_node_tag="node",
+                     count_tag="count",
+                     val_tag="val",
+                     attributes_dict={"magnitude": "count"},
+                     attribute_dict={"display": "Count"},
+                     root_node_dict={"name": "Root",
+                                     "rankID": "0",
+                                     "taxlevel": "0"},
+                     indent="  ",
+                     rank_sep=".",
+                     file_mode="wb"):
+    """
+    Convert mothur's tax.summary file to ktImportXML compatible xml file
+    incrementally. The input is read row by row and only the currently open
+    branch of the tree is kept in memory, so memory usage depends on the tree
+    depth instead of number of taxa and groups. Output is identical with
+    mothulity.utilities.constr_krona_xml.
+
+    Requires rows of the tax.summary file to be in depth-first order, as
+    written by mothur, ie each taxon placed after its mother taxon.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    output_file_name: str
+        Output file name.
+    sep: str, default <\t>
+        Separator in input file.
+    indent: str, default <  >
+        Indentation of a single level in output file.
+    rank_sep: str, default <.>
+        Separator of the rankID levels.
+    file_mode: str, default <wb>
+        Mode in which output file is opened. Use <ab> to append the xml to an
+        already existing file.
+
+    Raises
+    -------
+    ValueError
+        If a taxon does not follow its mother taxon or the first row is not
+        the root taxon.
+    """
+    from lxml import etree as et
+    def newline(depth):
+        return "\n{}".format(indent * depth)
+
+    root_rank = root_node_dict["rankID"]
+    with open(input_file_name, newline="") as fin, open(output_file_name, file_mode) as fout:
+        reader = csv.reader(fin, delimiter=sep)
+        groups_list = next(reader)[5:]
+        row = next(reader, None)
+        if row is None or row[1] != root_rank:
+            raise ValueError("No counts found for rankID {}".format(root_rank))
+        root_counts = row[5:]
+        pending = [next(reader, None)]
+        open_ranks = []
+        with et.xmlfile(fout, encoding="UTF-8") as xf:
+
+            def write_node(attrib, counts, depth):
+                xf.write(newline(depth))
+                with xf.element(root_node_tag, attrib):
+                    open_ranks.append(attrib["rankID"])
+                    while pending[0] is not None:
+                        tax_level, rank_id, taxon = pending[0][:3]
+                        mother_rank = rank_id.rsplit(rank_sep, 1)[0]
+                        if mother_rank != attrib["rankID"]:
+                            if mother_rank not in open_ranks:
+                                raise ValueError(
+                                    "Taxon {} (rankID {}) does not follow its mother taxon. "
+                                    "Rows are not in depth-first order.".format(taxon, rank_id)
+                                )
+                            break
+                        daughter_counts = pending[0][5:]
+                        pending[0] = next(reader, None)
+                        write_node({"name": taxon,
+                                    "rankID": rank_id,
+                                    "taxlevel": tax_level},
+                                   daughter_counts,
+                                   depth + 1)
+                    open_ranks.pop()
+                    xf.write(newline(depth + 1))
+                    with xf.element(count_tag):
+                        for i in counts:
+                            xf.write(newline(depth + 2))
+                            with xf.element(val_tag):
+                                xf.write(i)
+                        xf.write(newline(depth + 1))
+                    xf.write(newline(depth))
+
+            xf.write_declaration()
+            with xf.element(root_tag):
+                xf.write(newline(1))
+                with xf.element(attributes_tag, attributes_dict):
+                    xf.write(newline(2))
+                    with xf.element(attribute_tag, attribute_dict):
+                        xf.write(attribute_text)
+                    xf.write(newline(1))
+                xf.write(newline(1))
+                with xf.element(datasets_tag):
+                    for i in groups_list:
+                        xf.write(newline(2))
+                        with xf.element(dataset_tag):
+                            xf.write(i)
+                    xf.write(newline(1))
+                write_node(root_node_dict, root_counts, 1)
+                xf.write(newline(0))
+        fout.write(b"\n")
+
+
+def krona_html_fragments(kronatools_path,
+                         script_file="src/krona-2.0.js",
+                         favicon_file="img/favicon.uri",
+                         hidden_img_file="img/hidden.uri",
+                         loading_img_file="img/loading.uri",
+                         logo_file="img/logo-med.uri"):
+    """
+    Build head and body tags of a standalone Krona page from the KronaTools
+    resources, the same way ktImportXML does.
+
+    Parameters
+    -------
+    kronatools_path: str
+        Directory containing KronaTools <src> and <img> directories.
+    script_file: str, default <src/krona-2.0.js>
+        Krona javascript file, relative to kronatools_path.
+    favicon_file: str, default <img/favicon.uri>
+        Favicon data URI file, relative to kronatools_path.
+    hidden_img_file: str, default <img/hidden.uri>
+        Hidden image data URI file, relative to kronatools_path.
+    loading_img_file: str, default <img/loading.uri>
+        Loading image data URI file, relative to kronatools_path.
+    logo_file: str, default <img/logo-med.uri>
+        Logo data URI file, relative to kronatools_path.
+
+    Returns
+    -------
+    dict of dicts
+        Tags of the <head> and <body> of Krona page as str. The data <div> is
+        not included.
+    """
+    def slurp(file_name):
+        with open(os.path.join(kronatools_path, file_name), encoding="utf-8") as fin:
+            return fin.read()
+
+    img_tag = '<img id="{}" src="{}" style="display:none"/>'
+    head = {"meta": '<meta charset="utf-8"/>',
+            "link": '<link rel="shortcut icon" href="{}"/>'.format(slurp(favicon_file)),
+            "script_not_found": '<script id="notfound">window.onload=function()'
+                                '{document.body.innerHTML=""}</script>',
+            "script_functional": '<script language="javascript" type="text/javascript">'
+                                 '\n{}\n  </script>'.format(slurp(script_file))}
+    body = {"img_hidden": img_tag.format("hiddenImage", slurp(hidden_img_file)),
+            "img_loading": img_tag.format("loadingImage", slurp(loading_img_file)),
+            "img_logo": img_tag.format("logo", slurp(logo_file)),
+            "noscript": "<noscript>Javascript must be enabled to view this page.</noscript>"}
+    return {"head": head,
+            "body": body}
+
+
+def constr_krona_html(input_file_name,
+                      output_file_name,
+                      kronatools_path):
+    """
+    Convert mothur's tax.summary file directly to a standalone Krona html page,
+    without intermediate xml file and ktImportXML call. The xml data is
+    written incrementally with mothulity.utilities.stream_krona_xml. Output is
+    identical with ktImportXML run on mothulity.utilities.constr_krona_xml
+    output.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    output_file_name: str
+        Output file name.
+    kronatools_path: str
+        Directory containing KronaTools <src> and <img> directories.
+    """
+    fragments = krona_html_fragments(kronatools_path)
+    head = fragments["head"]
+    body = fragments["body"]
+    header = "".join([
+        '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" '
+        '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">\n',
+        '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">\n',
+        " <head>\n",
+        "".join("  {}\n".format(head[i]) for i in ("meta",
+                                                   "link",
+                                                   "script_not_found",
+                                                   "script_functional")),
+        " </head>\n",
+        " <body>\n",
+        "".join("  {}\n".format(body[i]) for i in ("img_hidden",
+                                                   "img_loading",
+                                                   "img_logo",
+                                                   "noscript")),
+        '  <div style="display:none">\n',
+    ])
+    with open(output_file_name, "wb") as fout:
+        fout.write(header.encode("utf-8"))
+    stream_krona_xml(input_file_name, output_file_name, file_mode="ab")
+    with open(output_file_name, "ab") as fout:
+        fout.write(b"</div></body></html>\n")
+
+
+def read_tax_tree(input_file_name,
+                  sep="\t",
+                  rank_sep=".",
+                  groups_start=5):
+    """
+    Read mothur's tax.summary file into compact, array-backed taxonomy tree.
+    Each taxon is identified by its row index. String rankIDs are replaced by
+    indices of the mother taxa and integer positions among sister taxa. Counts
+    of all the groups are stored in a single dense matrix.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    sep: str, default <\t>
+        Separator in input file.
+    rank_sep: str, default <.>
+        Separator of the rankID levels.
+    groups_start: int, default <5>
+        Index of the first group column in input file.
+
+    Returns
+    -------
+    dict
+        <taxa>: numpy.ndarray of str, taxa names.
+        <levels>: numpy.ndarray of int, taxonomical levels.
+        <parents>: numpy.ndarray of int, mother taxa indices, -1 for root.
+        <ranks>: numpy.ndarray of int, last level of the taxa rankIDs.
+        <groups>: list of str, group names.
+        <counts>: numpy.ndarray of int, taxa x groups count matrix.
+    """
+    import numpy as np
+    df = read_table(input_file_name, sep=sep, dtype={"rankID": "str"})
+    rank_ids = df.rankID.tolist()
+    rank_index = {rank_id: i for i, rank_id in enumerate(rank_ids)}
+    parents = np.array([rank_index.get(i.rsplit(rank_sep, 1)[0], -1)
+                        if rank_sep in i else -1
+                        for i in rank_ids],
+                       dtype=np.int32)
+    ranks = np.array([i.rsplit(rank_sep, 1)[-1] for i in rank_ids], dtype=np.int32)
+    groups = list(df.columns[groups_start:])
+    return {"taxa": df.taxon.values.astype(str),
+            "levels": df.taxlevel.values.astype(np.int32),
+            "parents": parents,
+            "ranks": ranks,
+            "groups": groups,
+            "counts": df[groups].values}
+
+
+def get_tax_ancestors(tax_tree):
+    """
+    Get indices of all the ancestors of each taxon in the taxonomy tree, level
+    by level, instead of walking up the tree taxon by taxon.
+
+    Parameters
+    -------
+    tax_tree: dict
+        Taxonomy tree from mothulity.utilities.read_tax_tree.
+
+    Returns
+    -------
+    numpy.ndarray of int
+        taxa x levels matrix of ancestor indices. Taxon itself is placed at its
+        own level, -1 marks levels deeper than the taxon or unknown ancestors.
+    """
+    import numpy as np
+    levels = tax_tree["levels"]
+    parents = tax_tree["parents"]
+    ancestors = np.full((len(levels), levels.max() + 1), -1, dtype=np.int32)
+    for level in range(levels.max() + 1):
+        taxa_idx = np.flatnonzero(levels == level)
+        with_parent = taxa_idx[parents[taxa_idx] >= 0]
+        ancestors[with_parent] = ancestors[parents[with_parent]]
+        ancestors[taxa_idx, level] = taxa_idx
+    return ancestors
+
+
+def tax_level_table(tax_tree,
+                    tax_level,
+                    ancestors=None,
+                    lineage_sep=";"):
+    """
+    Get abundance table of all the taxa at given taxonomical level. Counts in
+    mothur's tax.summary file are already rolled up to the mother taxa so the
+    table is sliced from the count matrix at once.
+
+    Parameters
+    -------
+    tax_tree: dict
+        Taxonomy tree from mothulity.utilities.read_tax_tree.
+    tax_level: int
+        Taxonomical level of the taxa in the table.
+    ancestors: numpy.ndarray of int, default <None>
+        Ancestors matrix from mothulity.utilities.get_tax_ancestors. Computed if
+        not passed.
+    lineage_sep: str, default <;>
+        Separator of taxa names in the lineage.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Taxa lineages, from level 1 down to tax_level, as index and groups as
+        columns.
+    """
+    import numpy as np
+    import pandas as pd
+    if ancestors is None:
+        ancestors = get_tax_ancestors(tax_tree)
+    taxa = tax_tree["taxa"]
+    taxa_idx = np.flatnonzero(tax_tree["levels"] == tax_level)
+    lineages = [lineage_sep.join(taxa[i[i >= 0]])
+                for i in ancestors[taxa_idx, 1:tax_level + 1]]
+    return pd.DataFrame(tax_tree["counts"][taxa_idx],
+                        index=pd.Index(lineages, name="lineage"),
+                        columns=tax_tree["groups"])
+
+
+def write_tax_level_tables(input_file_name,#pylint: disable=dangerous-default-value
+                           output_file_prefix,
+                           tax_levels={"phylum": 2,
+                                       "family": 5,
+                                       "genus": 6},
+                           sep="\t"):
+    """
+    Write abundance tables of taxa at the taxonomical levels, eg phylum, family
+    and genus, from mothur's tax.summary file. The file is read only once.
+
+    Parameters
+    -------
+    input_file_name: str
+        Input file name.
+    output_file_prefix: str
+        Output files names prefix. Tables are saved as
+        <output_file_prefix>.<level name>.tsv.
+    tax_levels: dict, default <{"phylum": 2, "family": 5, "genus": 6}>
+        Taxonomical levels names as keys and values as in the tax.summary file.
+    sep: str, default <\t>
+        Separator in input and output files.
+    """
+    tax_tree = read_tax_tree(input_file_name, sep=sep)
+    ancestors = get_tax_ancestors(tax_tree)
+    for name, level in tax_levels.items():
+        tax_level_table(tax_tree,
+                        level,
+                        ancestors=ancestors).to_csv("{}.{}.tsv".format(output_file_prefix,
+                                                                       name),
+                                                    sep=sep)
+
+
 def define_region_pos(region):
     """
     Defines alignment database's region position.
@@ -22,14 +22,10 @@ cp analysis_travis_job.shared ./alpha
 cp analysis_travis_job.0.03.subsample.shared ./beta/
 
 
-#Go to alpha directory and create krona chart, rarefaction, summary table
+#Go to alpha directory and create rarefaction and summary files
 
 cd ./alpha
-mothulity_draw analysis_travis_job.tax.summary --output analysis_travis_job.krona.xml  --krona-xml
-ktImportXML analysis_travis_job.krona.xml -o analysis_travis_job.krona.html
 mothur '#set.current(processors=2, shared=analysis_travis_job.shared); rarefaction.single(shared=current, calc=sobs, freq=100); summary.single(shared=current, calc=nseqs-coverage-sobs-ace-chao-jack-simpson-invsimpson-shannon-npshannon, subsample=T)'
-mothulity_draw analysis_travis_job.groups.rarefaction --output analysis_travis_job.raref.html --rarefaction
-mothulity_draw analysis_travis_job.groups.ave-std.summary --output analysis_travis_job.sum.html --summary-table
 
 
 #Go to beta directory and create dist files for Jaccard and YC measures
@@ -47,19 +43,24 @@ mothur '#nmds(phylip=analysis_travis_job.0.03.subsample.jclass.0.03.square.dist)
 
 
 
-#Draw beta directory pictures for Jaccard and YC measures
-
-mothulity_draw analysis_travis_job.0.03.subsample.jclass.0.03.square.dist --output analysis_travis_job.jclass.dist.svg --phylip
-mothulity_draw analysis_travis_job.0.03.subsample.jclass.0.03.square.tre --output analysis_travis_job.0.03.jclass.tre.svg --tree
-mothulity_draw analysis_travis_job.0.03.subsample.jclass.0.03.square.nmds.axes --output analysis_travis_job.jclass.nmds.html --axes
-mothulity_draw analysis_travis_job.0.03.subsample.thetayc.0.03.square.dist --output analysis_travis_job.thetayc.dist.svg --phylip
-mothulity_draw analysis_travis_job.0.03.subsample.thetayc.0.03.square.tre --output analysis_travis_job.0.03.thetayc.tre.svg --tree
-mothulity_draw analysis_travis_job.0.03.subsample.thetayc.0.03.square.nmds.axes --output analysis_travis_job.thetayc.nmds.html --axes
-
 #Go to OTU directory
 
 cd ../
 
+#Draw all the charts, tables and pictures at once
+
+mothulity_draw --assets-dir assets --json-table --processes 2 \
+--job krona-html alpha/analysis_travis_job.tax.summary alpha/analysis_travis_job.krona.html \
+--job rank-tables alpha/analysis_travis_job.tax.summary alpha/analysis_travis_job \
+--job rarefaction alpha/analysis_travis_job.groups.rarefaction alpha/analysis_travis_job.raref.html \
+--job summary-table alpha/analysis_travis_job.groups.ave-std.summary alpha/analysis_travis_job.sum.html \
+--job phylip beta/analysis_travis_job.0.03.subsample.jclass.0.03.square.dist beta/analysis_travis_job.jclass.dist.svg \
+--job tree beta/analysis_travis_job.0.03.subsample.jclass.0.03.square.tre beta/analysis_travis_job.0.03.jclass.tre.svg \
+--job axes beta/analysis_travis_job.0.03.subsample.jclass.0.03.square.nmds.axes beta/analysis_travis_job.jclass.nmds.html \
+--job phylip beta/analysis_travis_job.0.03.subsample.thetayc.0.03.square.dist beta/analysis_travis_job.thetayc.dist.svg \
+--job tree beta/analysis_travis_job.0.03.subsample.thetayc.0.03.square.tre beta/analysis_travis_job.0.03.thetayc.tre.svg \
+--job axes beta/analysis_travis_job.0.03.subsample.thetayc.0.03.square.nmds.axes beta/analysis_travis_job.thetayc.nmds.html
+
 #Render html output
 mothulity /home/travis/build/dizak/mothulity/test_data/analysis/mltp_smpl/shared_tax/ --render-html --job-name analysis_travis_job
 
@@ -69,4 +70,4 @@ cd ../../
 
 #Zip the results
 
-zip -r analysis_travis_job.zip analysis/
+zip -r analysis_travis_job.zip analysis/ -x "*.cache.npz" "*.render.json" "*.render.*.json"
@@ -20,19 +20,23 @@ mothur '#set.current(processors=2, shared=analysis_travis_job.shared); sub.sampl
 cp analysis_travis_job.shared ./alpha
 
 
-#Go to alpha directory and create krona chart, rarefaction, summary table
+#Go to alpha directory and create rarefaction and summary files
 
 cd ./alpha
-mothulity_draw analysis_travis_job.tax.summary --output analysis_travis_job.krona.xml  --krona-xml
-ktImportXML analysis_travis_job.krona.xml -o analysis_travis_job.krona.html
 mothur '#set.current(processors=2, shared=analysis_travis_job.shared); rarefaction.single(shared=current, calc=sobs, freq=100); summary.single(shared=current, calc=nseqs-coverage-sobs-ace-chao-jack-simpson-invsimpson-shannon-npshannon, subsample=T)'
-mothulity_draw analysis_travis_job.groups.rarefaction --output analysis_travis_job.raref.html --rarefaction
-mothulity_draw analysis_travis_job.groups.ave-std.summary --output analysis_travis_job.sum.html --summary-table
 
 #Go to OTU directory
 
 cd ../
 
+#Draw all the charts, tables and pictures at once
+
+mothulity_draw --assets-dir assets --json-table --processes 2 \
+--job krona-html alpha/analysis_travis_job.tax.summary alpha/analysis_travis_job.krona.html \
+--job rank-tables alpha/analysis_travis_job.tax.summary alpha/analysis_travis_job \
+--job rarefaction alpha/analysis_travis_job.groups.rarefaction alpha/analysis_travis_job.raref.html \
+--job summary-table alpha/analysis_travis_job.groups.ave-std.summary alpha/analysis_travis_job.sum.html
+
 #Render html output
 mothulity /home/travis/build/dizak/mothulity/test_data/analysis/single_smpl/shared_tax/ --render-html --job-name analysis_travis_job
 
@@ -42,4 +46,4 @@ cd ../../
 
 #Zip the results
 
-zip -r analysis_travis_job.zip analysis/
+zip -r analysis_travis_job.zip analysis/ -x "*.cache.npz" "*.render.json" "*.render.*.json"
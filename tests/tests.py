@@ -1,11 +1,27 @@
 
 from __future__ import print_function
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import sys
+import threading
+import hashlib
+import tarfile
+import zipfile
+from io import BytesIO
+from six.moves import SimpleHTTPServer, socketserver
+from glob import glob
 import six
 import unittest
+from unittest import mock
 from six.moves import configparser
 import subprocess as sp
 from mothulity import utilities
 import pandas as pd
+import requests
+import numpy as np
 
 
 class PathTests(unittest.TestCase):
@@ -48,6 +64,71 @@ class PathTests(unittest.TestCase):
                          "mothur")
 
 
+class StartupTests(unittest.TestCase):
+    """
+    Tests of the entry points start-up.
+    """
+    def setUp(self):
+        """
+        Sets up class level attributes for the tests.
+        """
+        self.heavy_modules = ["Bio",
+                              "bs4",
+                              "jinja2",
+                              "lxml",
+                              "matplotlib",
+                              "numpy",
+                              "pandas",
+                              "psutil",
+                              "requests",
+                              "seaborn",
+                              "tqdm"]
+        self.startup_code = """
+import runpy, sys
+sys.argv = ['{0}', '--version']
+try:
+    runpy.run_path('mothulity/{0}', run_name='__main__')
+except SystemExit:
+    pass
+print(' '.join(sys.modules))
+"""
+
+    def check_startup(self, entry_point):
+        """
+        Runs the entry point with --version and checks if it does not import
+        heavy modules.
+        """
+        output = sp.check_output([sys.executable,
+                                  "-c",
+                                  self.startup_code.format(entry_point)])
+        imported_modules = set(i.split(".")[0] for i in output.decode('utf-8').split())
+        self.assertEqual([i for i in self.heavy_modules if i in imported_modules], [])
+
+    def test_mothulity_startup(self):
+        """
+        Tests mothulity start-up.
+        """
+        self.check_startup("mothulity")
+
+    def test_mothulity_dbaser_startup(self):
+        """
+        Tests mothulity_dbaser start-up.
+        """
+        self.check_startup("mothulity_dbaser")
+
+    def test_mothulity_draw_startup(self):
+        """
+        Tests mothulity_draw start-up.
+        """
+        self.check_startup("mothulity_draw")
+
+    def test_mothulity_fc_startup(self):
+        """
+        Tests mothulity_fc start-up.
+        """
+        self.check_startup("mothulity_fc")
+
+
 class ConfigTests(unittest.TestCase):
     """
     Tests of the config file.
@@ -109,6 +190,40 @@ class ConfigTests(unittest.TestCase):
         self.assertEqual(self.ref_values, self.test_values)
 
 
+class RangeRequestHandler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    """
+    Local stand-in of a download server accepting byte ranges. Serves the
+    files of served_dir.
+    """
+    ranges = []
+    served_dir = '.'
+    accept_ranges = True
+
+    def log_message(self, *args):#pylint: disable=arguments-differ
+        pass
+
+    def translate_path(self, path):
+        return os.path.join(self.served_dir, os.path.basename(path.split('?')[0]))
+
+    def end_headers(self):
+        if self.command == 'HEAD' and self.accept_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        SimpleHTTPServer.SimpleHTTPRequestHandler.end_headers(self)
+
+    def send_head(self):
+        if self.command == 'HEAD' or 'Range' not in self.headers:
+            return SimpleHTTPServer.SimpleHTTPRequestHandler.send_head(self)
+        start, end = [int(i) for i in self.headers['Range'].split('=')[1].split('-')]
+        self.ranges.append(start)
+        with open(self.translate_path(self.path), 'rb') as fin:
+            fin.seek(start)
+            content = fin.read(end - start + 1)
+        self.send_response(206)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        return BytesIO(content)
+
+
 class UtilitiesTests(unittest.TestCase):
     """
     Tests of mothulity.utilities module.
@@ -154,6 +269,43 @@ class UtilitiesTests(unittest.TestCase):
         self.mother_taxon = 'Actinobacteria'
         self.mother_rank = '0.1.1.1' 
         self.tax_level = 3
+        self.temp_dir = tempfile.mkdtemp(prefix='tmp.', dir='./tests')
+        self.addCleanup(shutil.rmtree, self.temp_dir, True)
+        self.ref_krona_xml_path = 'test_data/utilities/ref_krona.xml'
+        self.krona_xml_path = os.path.join(self.temp_dir, 'test.krona.xml')
+        self.krona_html_path = os.path.join(self.temp_dir, 'test.krona.html')
+        self.kronatools_path = 'bin/kronatools'
+        self.shared_path = './tests/test.shared'
+        self.multi_label_shared_path = os.path.join(self.temp_dir, 'test.labels.shared')
+        self.sparse_shared_path = os.path.join(self.temp_dir, 'test.sparse.shared')
+        self.cached_shared_path = os.path.join(self.temp_dir, 'test.cached.shared')
+        self.phylip_path = os.path.join(self.temp_dir, 'test.square.dist')
+        self.heatmap_path = os.path.join(self.temp_dir, 'test.heatmap.png')
+        self.tree_path = './tests/test.tre'
+        self.tree_figure_path = os.path.join(self.temp_dir, 'test.tre.svg')
+        self.axes_path = os.path.join(self.temp_dir, 'test.axes')
+        self.scatter_path = os.path.join(self.temp_dir, 'test.scatter.html')
+        self.assets_dir = os.path.join(self.temp_dir, 'assets')
+        self.summary_path = os.path.join(self.temp_dir, 'test.ave-std.summary')
+        self.summary_html_path = os.path.join(self.temp_dir, 'test.sum.html')
+        self.page_path = os.path.join(self.temp_dir, 'test.page.html')
+        self.render_manifest_path = os.path.join(self.temp_dir, '.test.render.json')
+        self.reads_dir = os.path.join(self.temp_dir, 'reads')
+        self.server_dir = os.path.join(self.temp_dir, 'server')
+        self.download_path = os.path.join(self.temp_dir, 'test.download.tgz')
+        self.databases_dir = os.path.join(self.temp_dir, 'databases')
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+
+    def serve(self):
+        """
+        Starts local download server of the server_dir files in a thread.
+        Returns the server and its URL.
+        """
+        RangeRequestHandler.served_dir = self.server_dir
+        RangeRequestHandler.accept_ranges = True
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), RangeRequestHandler)
+        threading.Thread(target=server.serve_forever).start()
+        return server, 'http://127.0.0.1:{}/'.format(server.server_address[1])
 
     def test_get_daughter_df(self):
         """
@@ -169,3 +321,575 @@ class UtilitiesTests(unittest.TestCase):
                 self.tax_level,
             ),
         )
+
+    def test_constr_krona_xml(self):
+        """
+        Test if krona xml constructed from the tax.summary file is identical
+        with the reference one.
+        """
+        with open(self.ref_krona_xml_path, 'rb') as fin:
+            ref_krona_xml = fin.read()
+        utilities.constr_krona_xml(self.tax_summary_path, self.krona_xml_path)
+        with open(self.krona_xml_path, 'rb') as fin:
+            krona_xml = fin.read()
+        self.assertEqual(ref_krona_xml, krona_xml)
+        self.assertEqual(glob('{}.*.cache.npz'.format(self.tax_summary_path)), [])
+
+    def test_stream_krona_xml(self):
+        """
+        Test if krona xml written incrementally from the tax.summary file is
+        identical with the reference one.
+        """
+        with open(self.ref_krona_xml_path, 'rb') as fin:
+            ref_krona_xml = fin.read()
+        utilities.stream_krona_xml(self.tax_summary_path, self.krona_xml_path)
+        with open(self.krona_xml_path, 'rb') as fin:
+            krona_xml = fin.read()
+        self.assertEqual(ref_krona_xml, krona_xml)
+
+    def test_constr_krona_html(self):
+        """
+        Test if krona html constructed from the tax.summary file embeds the
+        reference krona xml.
+        """
+        with open(self.ref_krona_xml_path, 'rb') as fin:
+            ref_krona_xml = fin.read()
+        utilities.constr_krona_html(
+            self.tax_summary_path,
+            self.krona_html_path,
+            self.kronatools_path,
+        )
+        with open(self.krona_html_path, 'rb') as fin:
+            krona_html = fin.read()
+        parsed_html = utilities.parse_html(self.krona_html_path, 'krona')
+        self.assertTrue(krona_html.endswith(
+            b'<div style="display:none">\n' + ref_krona_xml + b'</div></body></html>\n'
+        ))
+        self.assertEqual(parsed_html['body']['img_logo'],
+                         utilities.krona_html_fragments(self.kronatools_path)['body']['img_logo'])
+
+    def test_tax_level_table(self):
+        """
+        Test if abundance table of a taxonomical level contains the counts of
+        all the taxa from this level of the tax.summary file.
+        """
+        tax_tree = utilities.read_tax_tree(self.tax_summary_path)
+        phylum_df = utilities.tax_level_table(tax_tree, 2)
+        ref_df = self.tax_summary_df[self.tax_summary_df.taxlevel == 2]
+        self.assertEqual(
+            list(phylum_df.index),
+            ['Bacteria;{}'.format(i) for i in ref_df.taxon],
+        )
+        self.assertEqual(
+            phylum_df.values.tolist(),
+            ref_df[['KA1k', 'QA1k']].values.tolist(),
+        )
+
+    def test_read_info_shared_label(self):
+        """
+        Test if label block of the multi-label shared file is found with the
+        labels index and read the same way as single-label shared file.
+        """
+        with open(self.shared_path) as fin:
+            header = fin.readline()
+            rows = fin.readlines()
+        with open(self.multi_label_shared_path, 'w') as fout:
+            fout.write(header)
+            for label in ['0.01', '0.03', '0.05']:
+                fout.writelines(label + i[i.index('\t'):] for i in rows)
+        labels_index = utilities.get_shared_labels_index(self.multi_label_shared_path)
+        shared_info = utilities.read_info_shared(self.multi_label_shared_path, label=0.05)
+        first_shared_info = utilities.read_info_shared(self.multi_label_shared_path)
+        sidecars = glob('{}.*'.format(self.multi_label_shared_path))
+        cached_shared_info = [utilities.read_info_shared(self.multi_label_shared_path,
+                                                         label=0.05,
+                                                         cache_dir=self.cache_dir) for _ in range(2)]
+        with self.assertRaises(ValueError):
+            utilities.read_info_shared(self.multi_label_shared_path, label=0.1)
+        with open(self.multi_label_shared_path, 'w') as fout:
+            fout.write('label\tGroup\tnumOtus\n0.03\tA\t0\n')
+        with self.assertRaisesRegex(ValueError, 'No OTU columns'):
+            utilities.read_info_shared(self.multi_label_shared_path)
+        self.assertEqual(sidecars, [])
+        self.assertEqual(cached_shared_info, [shared_info] * 2)
+        self.assertEqual(list(labels_index), ['0.01', '0.03', '0.05'])
+        self.assertEqual([i[1] for i in labels_index.values()], [len(rows)] * 3)
+        self.assertEqual(shared_info['label'], '0.05')
+        self.assertEqual(first_shared_info['label'], '0.01')
+        self.assertEqual(
+            shared_info['junk_grps'],
+            utilities.read_info_shared(self.shared_path)['junk_grps'],
+        )
+
+    def test_sparse_shared(self):
+        """
+        Test if sparse shared table is written back identical with the original
+        shared file and if subsampling draws the same number of counts from
+        each group.
+        """
+        sparse_shared = utilities.read_sparse_shared(self.shared_path)
+        utilities.write_sparse_shared(sparse_shared, self.sparse_shared_path)
+        with open(self.shared_path) as fin:
+            shared = fin.read()
+        with open(self.sparse_shared_path) as fin:
+            written_shared = fin.read()
+        self.assertEqual(shared, written_shared)
+        self.assertEqual(
+            '-'.join(utilities.sparse_junk_groups(sparse_shared)),
+            utilities.read_info_shared(self.shared_path)['junk_grps'],
+        )
+        subsampled = utilities.subsample_sparse_shared(sparse_shared, size=3000, seed=0)
+        self.assertEqual(subsampled['groups'], sparse_shared['groups'][4:])
+        self.assertEqual(utilities.sparse_group_totals(subsampled).tolist(), [3000] * 5)
+        for i in range(5):
+            counts = dict(zip(
+                sparse_shared['indices'][sparse_shared['indptr'][i + 4]:sparse_shared['indptr'][i + 5]],
+                sparse_shared['data'][sparse_shared['indptr'][i + 4]:sparse_shared['indptr'][i + 5]],
+            ))
+            sub_counts = zip(
+                subsampled['indices'][subsampled['indptr'][i]:subsampled['indptr'][i + 1]],
+                subsampled['data'][subsampled['indptr'][i]:subsampled['indptr'][i + 1]],
+            )
+            self.assertTrue(all(0 < count <= counts.get(otu, 0) for otu, count in sub_counts))
+
+    def test_read_table_cache(self):
+        """
+        Test if table read from the binary cache is identical with the one read
+        from the text file and if the cache is invalidated when the text file
+        changes or the cache is truncated.
+        """
+        with open(self.shared_path) as fin:
+            shared = fin.readlines()
+        with open(self.cached_shared_path, 'w') as fout:
+            fout.writelines(shared)
+        ref_df = pd.read_csv(self.cached_shared_path, sep='\t', index_col='Group')
+        utilities.read_table(self.cached_shared_path, cache_dir=self.cache_dir, index_col='Group')
+        cached_df = utilities.read_table(self.cached_shared_path, cache_dir=self.cache_dir, index_col='Group')
+        with open(self.cached_shared_path, 'w') as fout:
+            fout.writelines(shared[:-1])
+        os.utime(self.cached_shared_path, (0, 0))
+        changed_df = utilities.read_table(self.cached_shared_path, cache_dir=self.cache_dir, index_col='Group')
+        cache_file_name = utilities.cache_file_path(self.cached_shared_path, 'table', self.cache_dir)
+        cache_saved = os.path.isfile(cache_file_name)
+        with open(cache_file_name, 'r+b') as fout:
+            fout.truncate(os.path.getsize(cache_file_name) // 2)
+        truncated_df = utilities.read_table(self.cached_shared_path, cache_dir=self.cache_dir, index_col='Group')
+        self.assertTrue(cache_saved)
+        self.assertEqual(glob('{}.*'.format(self.cached_shared_path)), [])
+        pd.testing.assert_frame_equal(ref_df, cached_df)
+        pd.testing.assert_frame_equal(ref_df.iloc[:-1], changed_df)
+        pd.testing.assert_frame_equal(ref_df.iloc[:-1], truncated_df)
+
+    def test_draw_heatmap_raster(self):
+        """
+        Test if phylip file is read into float32 matrix and if the matrix
+        bigger than raster_min_size is drawn with clustered samples.
+        """
+        samples = ['S{}'.format(i) for i in range(120)]
+        with open(self.phylip_path, 'w') as fout:
+            fout.write('{}\n'.format(len(samples)))
+            for i, sample in enumerate(samples):
+                fout.write('\t'.join([sample] + [str(float(i % 2 != j % 2)) for j in range(len(samples))]))
+                fout.write('\n')
+        names, matrix = utilities.read_phylip_matrix(self.phylip_path)
+        order = utilities.cluster_order(matrix)
+        utilities.draw_heatmap(self.phylip_path, self.heatmap_path, cluster=True)
+        heatmap_saved = os.path.getsize(self.heatmap_path) > 0
+        self.assertEqual(names, samples)
+        self.assertEqual(matrix.dtype.name, 'float32')
+        self.assertEqual(sorted(i % 2 for i in order[:60]), [order[0] % 2] * 60)
+        self.assertTrue(heatmap_saved)
+
+    def test_draw_heatmaps(self):
+        """
+        Test if heatmaps drawn one after another in the same process are each
+        drawn on their own figure and if the figures are closed.
+        """
+        plt = utilities.import_pyplot()
+        for samples_num in (4, 6):
+            with open('{0}.{1}'.format(self.phylip_path, samples_num), 'w') as fout:
+                fout.write('{}\n'.format(samples_num))
+                for i in range(samples_num):
+                    fout.write('\t'.join(['S{}'.format(i)] + [str(float(i != j)) for j in range(samples_num)]))
+                    fout.write('\n')
+        heatmaps = []
+        for samples_num in (6, 4, 6):
+            utilities.draw_heatmap('{0}.{1}'.format(self.phylip_path, samples_num), self.heatmap_path, raster=False)
+            with open(self.heatmap_path, 'rb') as fin:
+                heatmaps.append(fin.read())
+        open_figures = plt.get_fignums()
+        self.assertEqual(heatmaps[0], heatmaps[2])
+        self.assertNotEqual(heatmaps[0], heatmaps[1])
+        self.assertEqual(open_figures, [])
+
+    def test_draw_tree(self):
+        """
+        Test if dendrogram nodes are placed at their distance from root and in
+        the middle of their children and if the dendrogram is saved.
+        """
+        x, y, depths = utilities.tree_layout(utilities.read_newick(self.tree_path))
+        utilities.draw_tree(self.tree_path, self.tree_figure_path)
+        tree_saved = os.path.getsize(self.tree_figure_path) > 0
+        self.assertEqual([round(i, 2) for i in x], [0.0, 0.05, 0.15, 0.25, 0.4])
+        self.assertEqual(y.tolist(), [1.25, 0.5, 0.0, 1.0, 2.0])
+        self.assertEqual(depths.tolist(), [0, 1, 2, 2, 1])
+        self.assertTrue(tree_saved)
+
+    def test_lttb_mask(self):
+        """
+        Test if rarefaction curves are downsampled within the point budget and
+        if ends of the curves are kept.
+        """
+        x = np.arange(1, 10001, dtype=float)
+        y = np.vstack([np.log(x), np.sqrt(x)]).T
+        y[6000:, 1] = np.nan
+        mask = utilities.lttb_mask(x, y, 100)
+        self.assertTrue(all(i <= 100 for i in mask.sum(axis=0)))
+        self.assertTrue(mask[0].all())
+        self.assertTrue(mask[9999, 0])
+        self.assertTrue(mask[5999, 1])
+        self.assertFalse(mask[6000:, 1].any())
+
+    def test_draw_scatter(self):
+        """
+        Test if all the points of many groups are drawn in one collection, if
+        the legend is capped at max_legend entries and if the same input gives
+        the same image.
+        """
+        with open(self.axes_path, 'w') as fout:
+            fout.write('group\taxis1\taxis2\n')
+            for i in range(60):
+                fout.write('G{0}\t{1}\t{2}\n'.format(i % 30, i, -i))
+        figures = []
+
+        def save_figure_html(fig, *args, **kwargs):
+            figures.append(fig)
+            return save_figure_html.original(fig, *args, **kwargs)
+
+        save_figure_html.original = utilities.save_figure_html
+        scatter_html = []
+        with mock.patch.object(utilities, 'save_figure_html', save_figure_html):
+            for _ in range(2):
+                utilities.draw_scatter(self.axes_path, self.scatter_path, max_legend=5)
+                with open(self.scatter_path) as fin:
+                    scatter_html.append(fin.read())
+        ax = figures[0].axes[0]
+        self.assertTrue(scatter_html[0].startswith("<img src='data:image/png;base64,"))
+        self.assertEqual(scatter_html[0], scatter_html[1])
+        self.assertEqual(len(ax.collections), 1)
+        self.assertEqual(len(ax.collections[0].get_offsets()), 60)
+        self.assertEqual(len(set(map(tuple, ax.collections[0].get_facecolors()))), 30)
+        self.assertEqual([i.get_text() for i in ax.get_legend().get_texts()],
+                         ['G0', 'G1', 'G2', 'G3', 'G4', '+25 more'])
+
+    def test_summary2html_json_data(self):
+        """
+        Test if summary table rows are passed to DataTables as JSON column
+        arrays and if the table holds the header only.
+        """
+        with open(self.summary_path, 'w') as fout:
+            fout.write('label\tgroup\tmethod\tsobs\n')
+            fout.write('0.03\tA\tave\t20\n')
+            fout.write('0.03\tB\tave\t30.5\n')
+        utilities.summary2html(
+            self.summary_path,
+            self.summary_html_path,
+            '<link rel="stylesheet" href="test.css">',
+            'js/datatables.js',
+            json_data=True,
+        )
+        summary_html = utilities.parse_html(self.summary_html_path, 'summary')
+        data = summary_html['data'].split('>', 1)[1].rsplit('<', 1)[0]
+        self.assertEqual(json.loads(data), {
+            'columns': ['label', 'group', 'method', 'sobs'],
+            'data': [[0.03, 0.03], ['A', 'B'], ['ave', 'ave'], [20.0, 30.5]],
+        })
+        self.assertNotIn('<td>', summary_html['table'])
+        self.assertIn('DataTable(options)', summary_html['script'])
+
+    def test_parse_html_selectors(self):
+        """
+        Test if tags are found by selectors, skipping tags in scripts and
+        keeping nested tags, and if the same fragments come from the cache.
+        """
+        with open(self.page_path, 'w') as fout:
+            fout.write('<html><head><script>var a = "<div id=\\"data\\">";</script></head>'
+                       '<body><img id="logo" src="logo.png"/>'
+                       '<div id="data"><div>A</div><div>B</div></div><p>end</p></body></html>')
+        selectors = {'page': {'logo': 'img#logo',
+                              'data': 'div[id=data]',
+                              'missing': 'table'}}
+        fragments = [utilities.parse_html(self.page_path, 'page', selectors=selectors, cache_dir=self.cache_dir)
+                     for _ in range(2)]
+        cached = os.path.isfile(utilities.cache_file_path(self.page_path, 'html', self.cache_dir))
+        self.assertEqual(fragments[0], {'page': {'logo': '<img id="logo" src="logo.png"/>',
+                                                 'data': '<div id="data"><div>A</div><div>B</div></div>',
+                                                 'missing': ''}})
+        self.assertEqual(fragments[0], fragments[1])
+        self.assertTrue(cached)
+
+    def test_cached_fragments(self):
+        """
+        Test if html fragments are parsed again only after the content of
+        their input file changed or their fragment file was modified and if
+        the manifest keeps the fragment file name instead of the fragment.
+        """
+        parsed = []
+
+        def parse(input_file_name, html_type):
+            parsed.append(input_file_name)
+            return utilities.parse_html(input_file_name, html_type)
+
+        sources = {'raref_html': [self.page_path, parse, {'html_type': 'rarefaction'}]}
+        fragments = []
+        for content in ['<img src="a.png">', '<img src="a.png">', '<img src="b.png">']:
+            with open(self.page_path, 'w') as fout:
+                fout.write(content)
+            os.utime(self.page_path, (len(fragments), len(fragments)))
+            fragments.append(utilities.cached_fragments(self.render_manifest_path, sources))
+        with open(self.render_manifest_path) as fin:
+            manifest = json.load(fin)
+        fragment_file_name = os.path.join(self.temp_dir, manifest['raref_html']['fragment_file'])
+        with open(fragment_file_name, 'w') as fout:
+            fout.write('{"img": "<img src=\\"c.png\\">"}')
+        fragments.append(utilities.cached_fragments(self.render_manifest_path, sources))
+        self.assertEqual([i['raref_html']['img'] for i in fragments],
+                         ['<img src="a.png">', '<img src="a.png">', '<img src="b.png">', '<img src="b.png">'])
+        self.assertEqual(len(parsed), 3)
+        self.assertNotIn('fragment', manifest['raref_html'])
+        self.assertEqual(manifest['raref_html']['fragment_file'], '.test.render.raref_html.json')
+
+    def test_index_read_pairs(self):
+        """
+        Test if reads files are paired by sample, direction section and the
+        rest of the name in subdirectories and if unpaired, duplicated and
+        unrecognized files are reported.
+        """
+        files = ['run1/A_S1_L001_R1_001.fastq.gz',
+                 'run1/A_S1_L001_R2_001.fastq.gz',
+                 'run1/A_S1_L002_R1_001.fastq.gz',
+                 'run1/A_S1_L002_R2_001.fastq.gz',
+                 'run1/B_S2_R1.fastq',
+                 'run2/B_S2_R1.fastq',
+                 'run2/B_S2_R2.fastq',
+                 'R1x_S3_R2.fastq',
+                 'R1x_S3_R1.txt',
+                 'CR1.fastq',
+                 'D_R1_R2.fastq',
+                 'R1_S4.fastq']
+        for i in files:
+            os.makedirs(os.path.dirname('{0}/{1}'.format(self.reads_dir, i)), exist_ok=True)
+            open('{0}/{1}'.format(self.reads_dir, i), 'w').close()
+        flat_pairs = utilities.index_read_pairs(self.reads_dir)
+        read_pairs = utilities.index_read_pairs(self.reads_dir, recursive=True)
+        def relative(paths):
+            return [os.path.relpath(i, self.reads_dir) for i in paths]
+
+        self.assertEqual(relative(flat_pairs['unpaired']), ['R1x_S3_R2.fastq'])
+        self.assertEqual([(i['name'], relative([i['left_reads'], i['right_reads']])) for i in read_pairs['pairs']],
+                         [('A', ['run1/A_S1_L001_R1_001.fastq.gz', 'run1/A_S1_L001_R2_001.fastq.gz']),
+                          ('A', ['run1/A_S1_L002_R1_001.fastq.gz', 'run1/A_S1_L002_R2_001.fastq.gz'])])
+        self.assertEqual(relative(read_pairs['duplicated']), ['run1/B_S2_R1.fastq',
+                                                              'run2/B_S2_R1.fastq',
+                                                              'run2/B_S2_R2.fastq'])
+        self.assertEqual(relative(read_pairs['unpaired']), ['R1x_S3_R2.fastq'])
+        self.assertEqual(relative(read_pairs['unrecognized']), ['CR1.fastq',
+                                                                'D_R1_R2.fastq',
+                                                                'R1_S4.fastq'])
+
+    def test_check_read_pairs(self):
+        """
+        Test if reads are counted in plain and gzipped files and if pairs with
+        broken files or different number of reads fail the check.
+        """
+        record = '@read\nACGT\n+\nIIII\n'
+        files = {'A_R1.fastq.gz': record * 3,
+                 'A_R2.fastq': record * 3,
+                 'B_R1.fastq': record * 3,
+                 'B_R2.fastq': record * 2,
+                 'C_R1.fastq': record + '@read\nACGT\n+\nII\n',
+                 'C_R2.fastq': record * 2}
+        os.makedirs(self.reads_dir)
+        for name, content in files.items():
+            opener = gzip.open if name.endswith('.gz') else open
+            with opener('{0}/{1}'.format(self.reads_dir, name), 'wt') as fout:
+                fout.write(content)
+        read_pairs = utilities.index_read_pairs(self.reads_dir, split_sign='_')
+        checked_pairs = utilities.check_read_pairs(read_pairs['pairs'], processes=2)
+        self.assertEqual([(i['name'], i['left_count'], i['right_count'], i['status']) for i in checked_pairs],
+                         [('A', 3, 3, 'ok'),
+                          ('B', 3, 2, 'different number of left and right reads'),
+                          ('C', 1, 2, 'left reads: record 2 has sequence and quality of different length')])
+
+    def test_profile_read_lengths(self):
+        """
+        Test if contig lengths are found from overlapping read pairs and if
+        screen.seqs bounds are set from them.
+        """
+        amplicon = 'ACGGTCATGCCATGATCGATTGCAGTCGATCGGATCCTAGCATGCATCGTACGATCGGCTAAGTCCGATGCA'
+        complement = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A'}
+        reads = {'A_R1.fastq': amplicon[:60],
+                 'A_R2.fastq.gz': ''.join(complement[i] for i in reversed(amplicon))[:55]}
+        os.makedirs(self.reads_dir)
+        for name, read in reads.items():
+            opener = gzip.open if name.endswith('.gz') else open
+            with opener('{0}/{1}'.format(self.reads_dir, name), 'wt') as fout:
+                fout.write('@read\n{0}\n+\n{1}\n'.format(read, 'I' * len(read)) * 3)
+        read_pairs = utilities.index_read_pairs(self.reads_dir, split_sign='_')['pairs']
+        profile = utilities.profile_read_lengths(read_pairs, max_reads=2, processes=1)
+        self.assertEqual(profile['left'].nonzero()[0].tolist(), [60])
+        self.assertEqual(profile['right'].nonzero()[0].tolist(), [55])
+        self.assertEqual(profile['contig'][len(amplicon)], 2)
+        self.assertEqual(utilities.length_bounds(profile['contig']), (len(amplicon), len(amplicon)))
+
+    def test_get_db_ranges(self):
+        """
+        Test if file is downloaded in parts from local server, if only the
+        missing parts are downloaded when resuming, if the parts are discarded
+        when the file changed on the server and if checksum is verified.
+        """
+        content = os.urandom(10000)
+        os.makedirs(self.server_dir)
+        with open('{}/db.tgz'.format(self.server_dir), 'wb') as fout:
+            fout.write(content)
+        server, url = self.serve()
+        url += 'db.tgz'
+        checksum = 'sha256:{}'.format(hashlib.sha256(content).hexdigest())
+        try:
+            utilities.get_db(url, self.download_path, connections=2, part_size=3000, checksum=checksum)
+            with open(self.download_path, 'rb') as fin:
+                downloaded = fin.read()
+            last_modified = requests.head(url).headers['Last-Modified']
+            resumed_ranges = []
+            for saved_last_modified in (last_modified, 'Thu, 01 Jan 1970 00:00:00 GMT'):
+                with open('{}.part'.format(self.download_path), 'wb') as fout:
+                    fout.write(content[:6000] + bytes(4000))
+                with open('{}.part.json'.format(self.download_path), 'w') as fout:
+                    json.dump({'url': url,
+                               'size': 10000,
+                               'part_size': 3000,
+                               'etag': None,
+                               'last_modified': saved_last_modified,
+                               'done': [0, 1]}, fout)
+                del RangeRequestHandler.ranges[:]
+                utilities.get_db(url, self.download_path, connections=2, part_size=3000, checksum=checksum)
+                resumed_ranges.append(sorted(RangeRequestHandler.ranges))
+            with open(self.download_path, 'rb') as fin:
+                resumed = fin.read()
+            with self.assertRaises(IOError):
+                utilities.get_db(url, self.download_path, checksum='md5:0')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(downloaded, content)
+        self.assertEqual(resumed, content)
+        self.assertEqual(resumed_ranges, [[6000, 9000], [0, 3000, 6000, 9000]])
+
+    def test_download_extract(self):
+        """
+        Test if tar archive is extracted into the existing directories from
+        the parts in order while they are downloaded, removing each part once
+        read, or from the stream if the server does not accept byte ranges,
+        zip archive after download, and if corrupted or unsafe archives or
+        wrong checksum leave nothing extracted behind.
+        """
+        content = os.urandom(5000)
+        os.makedirs(self.server_dir)
+        os.makedirs(self.databases_dir)
+        with tarfile.open('{}/db.tgz'.format(self.server_dir), 'w:gz') as archive:
+            info = tarfile.TarInfo('silva/silva.align')
+            info.size = len(content)
+            archive.addfile(info, BytesIO(content))
+        with open('{}/db.tgz'.format(self.server_dir), 'rb') as fin:
+            tgz = fin.read()
+        with open('{}/broken.tgz'.format(self.server_dir), 'wb') as fout:
+            fout.write(tgz[:len(tgz) // 2])
+        with tarfile.open('{}/unsafe.tgz'.format(self.server_dir), 'w:gz') as archive:
+            info = tarfile.TarInfo('../unsafe.align')
+            info.size = len(content)
+            archive.addfile(info, BytesIO(content))
+        with zipfile.ZipFile('{}/db.zip'.format(self.server_dir), 'w') as archive:
+            archive.writestr('unite.fasta', content)
+        os.makedirs('{}/silva'.format(self.databases_dir))
+        open('{}/silva/silva.tax'.format(self.databases_dir), 'w').close()
+        server, url = self.serve()
+        checksum = 'md5:{}'.format(hashlib.md5(tgz).hexdigest())
+        try:
+            extracted = [utilities.download(self.databases_dir, 'db.tgz', url + 'db.tgz', checksum=checksum),
+                         utilities.download(self.databases_dir, 'db.zip', url + 'db.zip')]
+            with open('{}/silva/silva.align'.format(self.databases_dir), 'rb') as fin:
+                silva = fin.read()
+            with open('{}/unite.fasta'.format(self.databases_dir), 'rb') as fin:
+                unite = fin.read()
+            databases = sorted(os.listdir(self.databases_dir))
+            os.remove('{}/silva/silva.align'.format(self.databases_dir))
+            extracted += [utilities.download(self.databases_dir, 'broken.tgz', url + 'broken.tgz'),
+                          utilities.download(self.databases_dir, 'unsafe.tgz', url + 'unsafe.tgz'),
+                          utilities.download(self.databases_dir, 'db.tgz', url + 'db.tgz', checksum='md5:0')]
+            failed_databases = sorted(os.listdir(self.databases_dir))
+            failed_silva_files = sorted(os.listdir('{}/silva'.format(self.databases_dir)))
+            del RangeRequestHandler.ranges[:]
+            parts_files = []
+            parts_glob = '{}.part.*'.format(self.download_path)
+
+            def consumer(fileobj):
+                class Reader(object):
+                    @staticmethod
+                    def read(size=-1):
+                        parts_files.append(len(glob(parts_glob)))
+                        return fileobj.read(size)
+
+                return utilities.extract_archive(Reader(), 'tgz', self.databases_dir)
+
+            utilities.get_db(url + 'db.tgz',
+                             self.download_path,
+                             chunk=100,
+                             connections=1,
+                             part_size=100,
+                             consumer=consumer)
+            parts_ranges = sorted(RangeRequestHandler.ranges)
+            left_files = glob('{}*'.format(self.download_path))
+            RangeRequestHandler.accept_ranges = False
+            shutil.rmtree('{}/silva'.format(self.databases_dir))
+            extracted.append(utilities.download(self.databases_dir, 'db.tgz', url + 'db.tgz', checksum=checksum))
+            with open('{}/silva/silva.align'.format(self.databases_dir), 'rb') as fin:
+                streamed_silva = fin.read()
+            streamed_databases = sorted(os.listdir(self.databases_dir))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(extracted, [True, True, False, False, False, True])
+        self.assertEqual(silva, content)
+        self.assertEqual(unite, content)
+        self.assertEqual(databases, ['silva', 'unite.fasta'])
+        self.assertEqual(failed_databases, ['silva', 'unite.fasta'])
+        self.assertEqual(failed_silva_files, ['silva.tax'])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'unsafe.align')))
+        self.assertEqual(parts_ranges, list(range(0, len(tgz), 100)))
+        self.assertTrue(0 < max(parts_files) <= 2)
+        self.assertEqual(left_files, [])
+        self.assertEqual(streamed_silva, content)
+        self.assertEqual(streamed_databases, ['silva', 'unite.fasta'])
+
+    def test_save_figure_html(self):
+        """
+        Test if the same figure saved twice in assets mode is written to one
+        file named by its content hash and if the html refers to it.
+        """
+        plt = utilities.import_pyplot()
+        image_file_names = []
+        for _ in range(2):
+            fig, ax = plt.subplots()
+            ax.plot([1, 2, 3], [3, 1, 2])
+            image_file_names.append(utilities.save_figure_html(
+                fig,
+                self.scatter_path,
+                assets_dir=self.assets_dir,
+                image_format='svg',
+            ))
+        with open(self.scatter_path) as fin:
+            scatter_html = fin.read()
+        assets = os.listdir(self.assets_dir)
+        self.assertEqual(image_file_names[0], image_file_names[1])
+        self.assertEqual(assets, [os.path.basename(image_file_names[0])])
+        self.assertIn("src='{}'".format(image_file_names[0]), scatter_html)